@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Read-through cache of TestRail GET responses
+
+    Responses are kept as raw bytes, so that the memory used is known and each hit is decoded into new objects that
+    callers may modify. Entries expire after a time to live depending on the endpoint, and the least recently used
+    entries are evicted beyond a size limit. A write (POST) invalidates the responses of the resources it changes.
+    Concurrent requests of the same URI share a single request (single flight).
+"""
+import collections
+import re
+import threading
+import time
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Time to live (seconds) of responses, by endpoint. 0 to never cache. Other endpoints use the default time to live.
+ENDPOINT_TTLS = {
+    'get_tests': 30,
+    'get_suites': 300,
+    'get_suite': 300,
+    'get_sections': 300,
+    'get_cases': 300,
+}
+
+# GET URIs changed by a write, by write endpoint. '{0}' is the first ID of the write URI. A URI ending with '/' matches
+# all the URIs of the endpoint (as does a pattern with '{0}' for a write URI without ID). Writes to other endpoints
+# invalidate the whole cache.
+INVALIDATIONS = {
+    'add_result': ('get_tests/', 'get_run/', 'get_plan/'),
+    'add_result_for_case': ('get_tests/{0}', 'get_run/{0}', 'get_plan/'),
+    'add_results': ('get_tests/', 'get_run/', 'get_plan/'),
+    'add_results_for_cases': ('get_tests/{0}', 'get_run/{0}', 'get_plan/'),
+    'add_run': ('get_runs/{0}', ),
+    'update_run': ('get_run/{0}', 'get_tests/{0}', 'get_plan/'),
+    'close_run': ('get_run/{0}', 'get_plan/'),
+    'add_plan': ('get_plans/{0}', ),
+    'add_plan_entry': ('get_plan/{0}', ),
+    'update_plan_entry': ('get_plan/{0}', 'get_run/', 'get_tests/'),
+    'update_plan': ('get_plan/{0}', 'get_plans/'),
+    'close_plan': ('get_plan/{0}', 'get_plans/', 'get_run/'),
+    'add_suite': ('get_suites/{0}', ),
+    'update_suite': ('get_suite/{0}', 'get_suites/'),
+    'add_section': ('get_sections/{0}', ),
+    'update_section': ('get_sections/', ),
+    'delete_section': ('get_sections/', 'get_cases/'),
+    'add_case': ('get_cases/', ),
+    'update_case': ('get_case/{0}', 'get_cases/'),
+}
+
+_URI_REGEX = re.compile('([a-z_]+)(?:/([0-9]+))?')
+
+CacheEntry = collections.namedtuple('CacheEntry', ['expiry', 'data'])
+
+
+class _Flight(object):
+    """ Request in progress, shared by the callers of the same URI """
+
+    def __init__(self):
+        """ Init """
+        self.done = threading.Event()
+        self.data = None
+        self.error = None
+        self.invalidated = False
+
+
+def _matches(uri, pattern):
+    """ Return True if `uri` is matched by an invalidation `pattern` """
+    if pattern.endswith('/'):
+        return uri.startswith(pattern)
+    return uri == pattern or (uri.startswith(pattern) and uri[len(pattern)] in '/&')
+
+
+class GetCache(object):
+    """ Cache of GET responses, shared by the threads of the process """
+
+    def __init__(self, default_ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, ttls=None, clock=time.monotonic):
+        """ Init
+        :param default_ttl: Time to live (seconds) of responses of endpoints without specific time to live
+        :param max_bytes: Maximum size of cached responses
+        :param ttls: Dict endpoint -> time to live, overriding `ENDPOINT_TTLS`
+        :param clock: Function returning current time in seconds
+        """
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.ttls = dict(ENDPOINT_TTLS, **(ttls or {}))
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def ttl(self, uri):
+        """ Return the time to live of the response of `uri` """
+        return self.ttls.get(_URI_REGEX.match(uri).group(1), self.default_ttl)
+
+    def get(self, uri, load):
+        """ Return the response of `uri`, from cache or loaded
+        :param uri: URI of the GET request
+        :param load: Function sending the request, returning the response (bytes)
+        """
+        ttl = self.ttl(uri)
+        if ttl <= 0:
+            return load()
+        leader = False
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is not None:
+                if entry.expiry > self.clock():
+                    self._entries.move_to_end(uri)
+                    self.hits += 1
+                    return entry.data
+                self._remove(uri)
+            flight = self._in_flight.get(uri)
+            if flight is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                flight = self._in_flight[uri] = _Flight()
+                leader = True
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.data
+
+        try:
+            flight.data = load()
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[uri]
+                if flight.error is None and not flight.invalidated:
+                    self._store(uri, CacheEntry(self.clock() + ttl, flight.data))
+            flight.done.set()
+        return flight.data
+
+    def invalidate(self, uri):
+        """ Drop the responses changed by a write
+        :param uri: URI of the POST request
+        """
+        match = _URI_REGEX.match(uri)
+        patterns = INVALIDATIONS.get(match.group(1)) if match else None
+        with self._lock:
+            if patterns is None:
+                keys = list(self._entries)
+                flights = list(self._in_flight.values())
+            else:
+                patterns = [pattern.format(match.group(2) or '') for pattern in patterns]
+                keys = [key for key in self._entries if any(_matches(key, pattern) for pattern in patterns)]
+                flights = [
+                    flight for key, flight in self._in_flight.items()
+                    if any(_matches(key, pattern) for pattern in patterns)
+                ]
+            for key in keys:
+                self._remove(key)
+            # Responses being loaded may predate the write: they are not cached
+            for flight in flights:
+                flight.invalidated = True
+
+    def clear(self):
+        """ Drop all responses """
+        self.invalidate('')    # Not a known write: invalidates everything
+
+    def _store(self, uri, entry):
+        """ Add an entry, evicting least recently used entries beyond the size limit """
+        if len(entry.data) > self.max_bytes:
+            return
+        if uri in self._entries:
+            self._remove(uri)
+        self._entries[uri] = entry
+        self.size += len(entry.data)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, uri):
+        """ Remove an entry """
+        self.size -= len(self._entries.pop(uri).data)
+
+
+def add_cache_arguments(parser):
+    """ Add cache options to an `argparse` parser """
+    group = parser.add_argument_group('cache')
+    group.add_argument(
+        '--tr-cache-ttl',
+        dest='cache_ttl',
+        metavar='SECONDS',
+        type=float,
+        default=DEFAULT_TTL,
+        help='Time to live of cached TestRail GET responses, for endpoints without specific time to live '
+        '(0: no cache). Default: %(default)s.')
+    group.add_argument(
+        '--tr-cache-size',
+        dest='cache_size',
+        metavar='MB',
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help='Maximum size of cached TestRail GET responses. Default: %(default)s.')
+
+
+def create_cache(arguments):
+    """ Return the cache configured by the options of `add_cache_arguments`. `None` if disabled. """
+    if arguments.cache_ttl <= 0:
+        return None
+    return GetCache(arguments.cache_ttl, int(arguments.cache_size * 1024 * 1024))
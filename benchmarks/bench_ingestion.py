@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Benchmark of the ingestion of XML and JSON Robot Framework outputs
+
+    A large output is generated in both formats, then read by `get_testcases` and `get_result_data`, and read again
+    from the result cache. Records read from both formats, and from the cache, are checked to be identical.
+
+    Usage: python benchmarks/bench_ingestion.py [--tests N] [--keywords N] [--mapped PERCENT] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import robotResult2Testrail    # noqa: E402 pylint: disable=wrong-import-position
+import result_cache    # noqa: E402 pylint: disable=wrong-import-position
+import robotframework2testrail    # noqa: E402 pylint: disable=wrong-import-position
+
+
+def make_result(tests, keywords, mapped=100):
+    """ Return a Robot Framework result of `tests` tests of `keywords` keywords, in suites of 100 tests
+    :param mapped: Percentage of tests published (with a TestRail ID, in a suite uploaded to TestRail)
+    """
+    from robot import result as robot_result
+    root = robot_result.TestSuite(name='Root', metadata={'UPLOAD_TO_TESTRAIL': ''} if mapped >= 100 else {})
+    suite = None
+    for index in range(tests):
+        if index % 100 == 0:
+            if mapped >= 100:
+                metadata = {'TEST_CASE_ID': 'C1'}
+            else:
+                metadata = {'UPLOAD_TO_TESTRAIL': ''} if (index // 100) % 100 < mapped else {}
+            suite = root.suites.create(name='Suite {}'.format(index // 100), metadata=metadata)
+        status = 'FAIL' if index % 10 == 0 else 'PASS'
+        tagged = index % 2 if mapped >= 100 else index % 100 < mapped
+        test = suite.tests.create(
+            name='TC_{} Test {}'.format(index, index),
+            tags=['test_case_id=C{}'.format(index)] if tagged else [],
+            status=status,
+            message='Error {}'.format(index) if status == 'FAIL' else '',
+            start_time='2024-01-01 00:00:00.000',
+            elapsed_time=index % 7 + 0.5)
+        for keyword in range(keywords):
+            test.body.create_keyword(
+                name='Keyword {}'.format(keyword), args=['arg 1', 'arg 2'], status='PASS',
+                start_time='2024-01-01 00:00:00.000', elapsed_time=0.001).body.create_message(
+                    'Message of keyword {}'.format(keyword))
+    return robot_result.Result(suite=root)
+
+
+def timed(func, repeat):
+    """ Return (result, best time in seconds) of `repeat` calls to `func` """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def as_dicts(records):
+    """ Dict views of records """
+    return [record.as_dict() for record in records]
+
+
+def main():
+    """ Run the benchmark """
+    parser = argparse.ArgumentParser(description='Benchmark of XML and JSON outputs ingestion')
+    parser.add_argument('--tests', type=int, default=10000, help='Number of tests. Default: %(default)s.')
+    parser.add_argument('--keywords', type=int, default=10, help='Keywords per test. Default: %(default)s.')
+    parser.add_argument('--mapped', type=int, default=100,
+                        help='Percentage of tests published, the others are dropped while reading. '
+                        'Default: %(default)s.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measure (best is kept). Default: %(default)s.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = make_result(args.tests, args.keywords, args.mapped)
+        outputs = {}
+        for output_format in ('xml', 'json'):
+            outputs[output_format] = os.path.join(directory, 'output.' + output_format)
+            result.save(outputs[output_format])
+        print('{} tests, {} keywords per test, {}% published'.format(args.tests, args.keywords, args.mapped))
+
+        timings = {}
+        for output_format, path in outputs.items():
+            testcases, timings['get_testcases', output_format] = timed(
+                lambda path=path: robotframework2testrail.get_testcases(path), args.repeat)
+            data, timings['get_result_data', output_format] = timed(
+                lambda path=path: robotResult2Testrail.get_result_data(path), args.repeat)
+            outputs[output_format] = (os.path.getsize(path), as_dicts(testcases), data[0], as_dicts(data[1]))
+
+        # Output read once (XML), then from cache
+        cache = result_cache.ResultCache(os.path.join(directory, 'cache'), min_size=0)
+        xml_path = os.path.join(directory, 'output.xml')
+        robotframework2testrail.get_testcases(xml_path, cache=cache)
+        testcases, timings['get_testcases', 'cache'] = timed(
+            lambda: robotframework2testrail.get_testcases(xml_path, cache=cache), args.repeat)
+        data, timings['get_result_data', 'cache'] = timed(
+            lambda: robotResult2Testrail.get_result_data(xml_path, cache=cache), args.repeat)
+
+        assert outputs['json'][1:] == outputs['xml'][1:], 'JSON and XML records differ'
+        assert (as_dicts(testcases), data[0], as_dicts(data[1])) == outputs['xml'][1:], 'Cached records differ'
+        print('{:<18}{:>12}{:>12}{:>10}{:>12}'.format('', 'XML (s)', 'JSON (s)', 'Speedup', 'Cached (s)'))
+        for function in ('get_testcases', 'get_result_data'):
+            xml_time, json_time = timings[function, 'xml'], timings[function, 'json']
+            print('{:<18}{:>12.3f}{:>12.3f}{:>9.1f}x{:>12.3f}'.format(function, xml_time, json_time,
+                                                                     xml_time / json_time, timings[function, 'cache']))
+        print('Output size: XML {:.1f} MB, JSON {:.1f} MB'.format(outputs['xml'][0] / 1e6, outputs['json'][0] / 1e6))
+
+
+if __name__ == '__main__':
+    main()
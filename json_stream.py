@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Incremental decoding of JSON arrays read from a stream
+
+    Items of the array are decoded and yielded one by one as the stream is read: the whole document is never held in
+    memory, as bytes, as text or as Python objects.
+"""
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACES = ' \t\n\r'
+_DELIMITERS = _WHITESPACES + ',:]}'
+_NOT_WHITESPACE_REGEX = re.compile('[^ \t\n\r]')
+
+
+class JsonReader(object):
+    """ Reader of the JSON document of a binary stream, read on demand
+
+        Objects and arrays are walked member by member (`iter_members`) and item by item (`iter_items`): the caller
+        decodes (`decode_value`) or discards (`discard_value`) each value before reading the next one.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        """ Init
+        :param stream: Binary file-like object
+        :param chunk_size: Size of chunks read from stream
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self, size=None):
+        """ Append a chunk of the stream to the buffer. Return False at end of stream.
+        :param size: Size of chunk. Default: `chunk_size`.
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(size or self.chunk_size)
+        if self.pos > len(self.buffer) // 2:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        if chunk:
+            self.buffer += self._text_decoder.decode(chunk)
+        else:
+            self.buffer += self._text_decoder.decode(b'', final=True)
+            self.eof = True
+        return True
+
+    def peek(self):
+        """ Return the next non-whitespace character, without consuming it. '' at end of stream. """
+        while True:
+            match = _NOT_WHITESPACE_REGEX.search(self.buffer, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buffer[self.pos]
+            self.pos = len(self.buffer)
+            if not self.read_more():
+                return ''
+
+    def expect(self, chars):
+        """ Consume the next non-whitespace character, which must be one of `chars` """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Invalid JSON: expected one of {!r} at {!r}'.format(
+                chars, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def decode_value(self):
+        """ Decode and consume the next JSON value """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of buffer may continue in next chunk: only accept a value followed by a delimiter
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Reads grow for large values, so that decoding attempts stay linear in the size of the value
+            self.read_more(size)
+            size *= 2
+
+    def discard_value(self):
+        """ Consume the next JSON value, and drop it
+
+            The value is not skipped: it is fully decoded as Python objects by `decode_value`, then dropped. The C
+            decoder of `json` is faster at this than scanning the value for its end in Python. Only one value is held in
+            memory at a time.
+        """
+        self.decode_value()
+
+    def iter_members(self):
+        """ Consume an object, yielding the name of each member. Its value must be consumed before next one. """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            name = self.decode_value()
+            self.expect(':')
+            yield name
+            if self.expect(',}') == '}':
+                return
+
+    def iter_items(self):
+        """ Consume an array, yielding its index before each item. The item must be consumed before next one. """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.expect(',]') == ']':
+                return
+
+
+def iter_json_array(stream, key=None, meta=None, fields=None, chunk_size=CHUNK_SIZE):
+    # pylint: disable=too-many-arguments
+    """ Yield the items of a JSON array read from a binary stream
+
+        :param stream: Binary file-like object (e.g. HTTP response)
+        :param key: If the document is an object, name of the member holding the array. Other members are decoded
+            into `meta`. A document which is an array is read as is.
+        :param meta: Dict receiving the other members of the document, if it is an object
+        :param fields: If set, items (dicts) are projected on these keys
+        :param chunk_size: Size of chunks read from stream
+    """
+    reader = JsonReader(stream, chunk_size)
+    meta = {} if meta is None else meta
+
+    if reader.peek() == '{':
+        if key is None:
+            raise ValueError('Invalid JSON: array expected, object found')
+        found = False
+        for member in reader.iter_members():
+            if member == key and reader.peek() == '[':
+                found = True
+                for item in _iter_items(reader, fields):
+                    yield item
+            else:
+                meta[member] = reader.decode_value()
+        if not found:
+            raise ValueError('Invalid JSON: no array "{}" in object'.format(key))
+    else:
+        for item in _iter_items(reader, fields):
+            yield item
+
+
+def _iter_items(reader, fields):
+    """ Yield decoded items of the next array """
+    for _ in reader.iter_items():
+        item = reader.decode_value()
+        if fields is not None and isinstance(item, dict):
+            item = {field: item[field] for field in fields if field in item}
+        yield item
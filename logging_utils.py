@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Logging pipeline shared by the command line tools
+
+    Records are put in a queue by the publishing thread and written by a `QueueListener` thread, so that
+    file and console I/O stay off the publish hot path. The log file rotates on size.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FORMAT = '%(asctime)-15s %(levelname)-10s %(message)s'
+
+# Lines logged once per test case go through this logger, so that they can be sampled and kept off the console
+TESTCASE_LOGGER_NAME = 'testrail.testcase'
+
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 5
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """ `QueueListener` that may be stopped several times """
+
+    def stop(self):
+        """ Stop the listener if started, after processing pending records """
+        if self._thread is not None:
+            super().stop()
+
+
+class SamplingFilter(logging.Filter):
+    """ Keep one record out of `rate` """
+
+    def __init__(self, rate=1):
+        """ Init """
+        super().__init__()
+        self.rate = max(1, rate)
+        self._count = 0
+
+    def filter(self, record):
+        """ Return True for the first record, then every `rate` records """
+        keep = self._count % self.rate == 0
+        self._count += 1
+        return keep
+
+
+class SummaryFilter(logging.Filter):
+    """ Drop per test case records below warning: only summary lines remain """
+
+    def filter(self, record):
+        """ Return False for informative per test case records """
+        return record.levelno >= logging.WARNING or not record.name.startswith(TESTCASE_LOGGER_NAME)
+
+
+def get_testcase_logger():
+    """ Return the logger of per test case lines """
+    return logging.getLogger(TESTCASE_LOGGER_NAME)
+
+
+def add_logging_arguments(parser):
+    """ Add logging options to an `argparse` parser """
+    group = parser.add_argument_group('logging')
+    group.add_argument(
+        '--log-file', dest='log_file', metavar='FILE', help='Log file. Default: <tool name>.log in working directory.')
+    group.add_argument(
+        '--log-max-bytes',
+        dest='log_max_bytes',
+        metavar='BYTES',
+        type=int,
+        default=DEFAULT_LOG_MAX_BYTES,
+        help='Size of log file triggering a rotation (0: never rotate). Default: %(default)s.')
+    group.add_argument(
+        '--log-backup-count',
+        dest='log_backup_count',
+        metavar='COUNT',
+        type=int,
+        default=DEFAULT_LOG_BACKUP_COUNT,
+        help='Number of rotated log files kept. Default: %(default)s.')
+    group.add_argument(
+        '--log-sample',
+        dest='log_sample',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Only log one per test case line out of N. Default: %(default)s (log all).')
+    group.add_argument(
+        '--log-summary-only', dest='log_summary_only', action='store_true', help='Only print summary on console.')
+
+
+def configure_logging(log_file,
+                      console_level=logging.INFO,
+                      max_bytes=DEFAULT_LOG_MAX_BYTES,
+                      backup_count=DEFAULT_LOG_BACKUP_COUNT,
+                      sample_rate=1,
+                      summary_only=False):
+    # pylint: disable=too-many-arguments
+    """ Configure the root logger to log everything in a rotating `log_file` and on console, through a queue
+
+        :param log_file: Path of the log file
+        :param console_level: Minimal level of console records
+        :param max_bytes: Size triggering a rotation of the log file. 0 to never rotate.
+        :param backup_count: Number of rotated log files kept
+        :param sample_rate: Only one per test case record out of `sample_rate` is logged
+        :param summary_only: If True, per test case records are not printed on console
+        :return: The started `QueueListener`. It is stopped at exit.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.abspath(log_file), maxBytes=max_bytes, backupCount=backup_count, encoding='UTF-8', delay=True)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    if summary_only:
+        console_handler.addFilter(SummaryFilter())
+
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.DEBUG)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    testcase_logger = get_testcase_logger()
+    for log_filter in [elt for elt in testcase_logger.filters if isinstance(elt, SamplingFilter)]:
+        testcase_logger.removeFilter(log_filter)
+    if sample_rate > 1:
+        testcase_logger.addFilter(SamplingFilter(sample_rate))
+
+    return listener
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Python API to publish Robot Framework results in TestRail, without the command line tools
+
+    Outputs are read once in a `ResultSet`, which both publishers use:
+
+        import publish
+
+        results = publish.read_results('output.xml', rerun_outputs=['rerun.xml'])
+        api = publish.connect('https://example.testrail.net', 'user@example.com', 'API_KEY', rate=3)
+        publish.publish_by_id(api, results, run_id=12)     # Results of tests with a TestRail ID, in existing runs
+        publish.publish_plan(api, results, project_id=1)   # Test suite templates, and a new Test Plan of results
+"""
+import api_cache
+import robotResult2Testrail
+import robotframework2testrail
+from rate_limit import HostRateLimiter, default_state_path
+from robot_results import ResultSet
+from scheduler import DEFAULT_MAX_WORKERS
+from testrail_utils import TestRailApiUtils
+
+
+def read_results(output, rerun_outputs=(), rerun_note=False, cache=None):
+    """ Read a Robot Framework output and the outputs of its reruns
+    :param output: Path of the output (XML or JSON), possibly compressed. '-' for stdin.
+    :param rerun_outputs: Paths of the outputs of reruns (`robot --rerunfailed`), in order
+    :param rerun_note: If True, note in comment that a result comes from a rerun
+    :param cache: `result_cache.ResultCache`, so that an output already read is not parsed again. `None`: no cache.
+    :return: `ResultSet`
+    """
+    return ResultSet.read(output, rerun_outputs, rerun_note, cache)
+
+
+def connect(url, user, password, rate=None, rate_file=None, cache_ttl=api_cache.DEFAULT_TTL,
+            cache_size=api_cache.DEFAULT_MAX_BYTES):
+    # pylint: disable=too-many-arguments
+    """ Return a client to TestRail API
+    :param url: URL of TestRail
+    :param user: Email of TestRail account
+    :param password: Password or API key of TestRail account
+    :param rate: Maximum number of requests per second, shared by the processes of the host. `None`: no limit.
+    :param rate_file: State file of the rate limit. Default: file in temporary directory, by URL.
+    :param cache_ttl: Time to live of cached GET responses (seconds). 0: no cache.
+    :param cache_size: Maximum size of cached GET responses (bytes)
+    """
+    api = TestRailApiUtils(url)
+    api.user = user
+    api.password = password
+    if rate:
+        api.rate_limiter = HostRateLimiter(rate, rate_file or default_state_path(url))
+    if cache_ttl > 0:
+        api.cache = api_cache.GetCache(cache_ttl, cache_size)
+    return api
+
+
+def publish_by_id(api, results, run_id=0, plan_id=0, version='', publish_blocked=True, delta=None):
+    # pylint: disable=too-many-arguments
+    """ Publish results of tests with a TestRail ID (tag or suite metadata) in a Test Run or the Test Runs of a Plan
+    :param api: Client to TestRail API, see `connect`
+    :param results: `ResultSet`
+    :param run_id: TestRail ID of Test Run to update
+    :param plan_id: TestRail ID of Test Plan to update
+    :param version: Version to indicate in Test Case result
+    :param publish_blocked: If False, results of "blocked" Test cases in TestRail are not published
+    :param delta: `robotframework2testrail.DeltaState`. If set, results with unchanged status are not published.
+    :return: True if publishing was done. False in case of error.
+    """
+    return robotframework2testrail.publish_results(
+        api,
+        robotframework2testrail.get_testcases_from_results(results),
+        run_id=run_id,
+        plan_id=plan_id,
+        version=version,
+        publish_blocked=publish_blocked,
+        print_testcases=False,
+        delta=delta)
+
+
+def publish_plan(api, results, project_id, max_workers=DEFAULT_MAX_WORKERS, plan_id=None, plan_name=None,
+                 rotate_after=None):
+    # pylint: disable=too-many-arguments
+    """ Update TestRail test suites from the suites with metadata UPLOAD_TO_TESTRAIL, and publish their results in a
+        new Test Plan, or in an open one
+    :param api: Client to TestRail API, see `connect`
+    :param results: `ResultSet`
+    :param project_id: TestRail ID of the project
+    :param max_workers: Maximum number of test suites published at the same time
+    :param plan_id: TestRail ID of an open Test Plan to append results to
+    :param plan_name: Name pattern (`fnmatch`, only '*') of the open Test Plan to append results to, created if none
+    :param rotate_after: Age in hours after which the Test Plan found by name is closed and a new one created
+    :return: True if publishing was done. False in case of error.
+    """
+    testsuites, testcases = robotResult2Testrail.get_result_data_from_results(results)
+    return robotResult2Testrail.create_testrail_testplan(api, testsuites, testcases, project_id, max_workers,
+                                                         plan_id, plan_name, rotate_after)
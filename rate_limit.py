@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Rate limitation of requests sent to TestRail
+
+    `HostRateLimiter` shares a token bucket between all the processes (and threads) of the host publishing to the same
+    TestRail instance, through a state file updated under an exclusive file lock: their aggregated rate stays under
+    the limit. A pause requested by TestRail (HTTP 429) is recorded in the bucket, so that all processes wait instead
+    of each one hitting the limit in turn.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:    # Windows
+    fcntl = None
+    import msvcrt
+
+
+def default_state_path(url):
+    """ Return the path of the state file shared by the processes publishing to the TestRail instance of `url` """
+    import tempfile    # Slow to import: only needed when publishing
+    digest = hashlib.sha1(url.rstrip('/').lower().encode('UTF-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), 'testrail-rate-{}.json'.format(digest))
+
+
+class HostRateLimiter(object):
+    """ Limit the rate of requests of all processes of the host sharing `path`: at most `rate` requests per second
+
+        The token bucket holds up to `burst` tokens. A request takes a token, or reserves the next one to come and
+        waits for it (outside of the lock). A pause moves the time of the bucket to the end of the pause.
+    """
+
+    def __init__(self, rate, path, burst=1):
+        """ Init
+        :param rate: Maximum number of requests per second, for all processes
+        :param path: Path of the state file shared by processes
+        :param burst: Maximum number of requests sent at once after an idle period
+        """
+        self.rate = rate
+        self.path = path
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Wait until a request may be sent """
+        with self._update() as state:
+            now = time.time()
+            tokens = self._tokens(state, now)
+            state['tokens'] = tokens - 1
+            state['time'] = now
+        wait = (1 - tokens) / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """ Delay next requests of all processes of `seconds` seconds """
+        with self._update() as state:
+            now = time.time()
+            if state['time'] < now + seconds:
+                # Bucket refills from the end of the pause
+                state['tokens'] = min(1, self._tokens(state, now))
+                state['time'] = now + seconds
+
+    def _tokens(self, state, now):
+        """ Return the tokens of the bucket at `now`. Negative when tokens to come are reserved. """
+        return min(self.burst, state['tokens'] + (now - state['time']) * self.rate)
+
+    @contextlib.contextmanager
+    def _update(self):
+        """ Context manager giving the state of the bucket, saved at exit. Processes and threads are serialized. """
+        with self._lock, open(self.path, 'a+', encoding='UTF-8') as state_file:
+            _lock_file(state_file)
+            try:
+                state_file.seek(0)
+                try:
+                    saved = json.loads(state_file.read())
+                except ValueError:    # New or corrupted file
+                    saved = {}
+                state = {
+                    'tokens': float(saved.get('tokens', self.burst)),
+                    'time': float(saved.get('time', time.time())),
+                }
+                yield state
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(json.dumps(state))
+                state_file.flush()
+            finally:
+                _unlock_file(state_file)
+
+
+def _lock_file(file):
+    """ Lock `file` exclusively, waiting for other processes """
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else:
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:    # Still locked after 10 attempts
+                pass
+
+
+def _unlock_file(file):
+    """ Unlock `file` """
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def add_rate_arguments(parser):
+    """ Add rate limitation options to an `argparse` parser """
+    parser.add_argument(
+        '--tr-rate',
+        dest='rate',
+        metavar='REQUESTS',
+        type=float,
+        help='Maximum number of requests per second sent to TestRail by all processes of the host publishing to the '
+        'same TestRail instance. Default: no limit.')
+    parser.add_argument(
+        '--tr-rate-file',
+        dest='rate_file',
+        metavar='FILE',
+        help='State file shared by the processes limited together by --tr-rate. Default: file in temporary directory, '
+        'by TestRail URL.')
+
+
+def create_rate_limiter(arguments, url):
+    """ Return the rate limiter configured by the options of `add_rate_arguments`. `None` if no limit. """
+    if not arguments.rate:
+        return None
+    return HostRateLimiter(arguments.rate, arguments.rate_file or default_state_path(url))
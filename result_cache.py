@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Local cache of the suites and tests read from Robot Framework outputs
+
+    Publishing the same output several times (in a Test Run, in a Test Plan, as TestRail templates) parses it once:
+    the fields of suites and tests used by the publishers are saved in a compact binary entry, reloaded instead of
+    parsing the output again.
+    An entry is keyed by the SHA-256 digest of the output file and by the version of the parsers. The digest of a file
+    is recorded with its size and modification time, so that an unchanged file isn't hashed again. Entries are memory
+    mapped, and decoded suite after suite: a cached output is streamed as it would be read. The least recently used
+    entries are evicted beyond a size limit. Outputs smaller than a threshold, and stdin, are not cached.
+
+    An entry is a sequence of frames (length, `marshal` data) of suite events, in the order the output is read:
+    start of a suite (index of parent suite, name), then end of a suite (index of suite, metadata, tests).
+"""
+import hashlib
+import json
+import logging
+import marshal
+import mmap
+import os
+import struct
+
+from robot_model import LightSuite, LightTest, filter_tests
+from robot_results import STDIN, iter_suites, open_output, read_suite
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MIN_SIZE = 10 * 1024 * 1024
+
+# To increase when the fields read from outputs change: entries of previous versions are ignored
+PARSER_VERSION = 2
+
+_MAGIC = b'RFTR\x01'
+_FRAME = struct.Struct('<I')
+_SUITE_START = 0
+_SUITE_END = 1
+_INDEX_FILE = 'index.json'
+
+
+def default_directory():
+    """ Return the default directory of the cache, in the cache directory of the user """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'robotframework-testrail')
+
+
+class ResultCache(object):
+    """ Cache of the suites read from Robot Framework outputs, in a directory """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, min_size=DEFAULT_MIN_SIZE):
+        """ Init
+        :param directory: Directory of the cache, created if needed
+        :param max_bytes: Maximum size of entries (bytes)
+        :param min_size: Minimum size of cached outputs (bytes)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+        self.hits = 0
+        self.misses = 0
+
+    def read_suite(self, path, test_filter=None):
+        """ Return the top level suite of the output of `path`, as `robot_results.read_suite`
+
+            Entries hold all tests: an output not cached yet is read without `test_filter`, applied afterwards.
+        """
+        entry, digest = self._lookup(path)
+        if entry is not None:
+            suite = [suite for suite in _iter_entry(entry, tree=True) if suite.parent is None][0]
+        elif digest is None:
+            with open_output(path) as stream:
+                return read_suite(stream, test_filter)
+        else:
+            with open_output(path) as stream:
+                suite = read_suite(stream)
+            writer = _EntryWriter()
+            writer.add_tree(suite)
+            self._store(digest, writer.frames)
+        if test_filter is not None:
+            filter_tests(suite, test_filter, recursive=True)
+        return suite
+
+    def iter_suites(self, path, test_filter=None):
+        """ Yield the suites of the output of `path` as they are read, as `robot_results.iter_suites` """
+        if test_filter is not None and test_filter.inherited:
+            test_filter = None    # Can't be evaluated before suites are yielded
+        entry, digest = self._lookup(path)
+        if entry is not None:
+            for suite in _iter_entry(entry):
+                if test_filter is not None:
+                    filter_tests(suite, test_filter)
+                yield suite
+            return
+        with open_output(path) as stream:
+            if digest is None:
+                yield from iter_suites(stream, test_filter)
+                return
+            writer = _EntryWriter()
+            for suite in iter_suites(stream):
+                writer.add_read_suite(suite)
+                if test_filter is not None:
+                    filter_tests(suite, test_filter)
+                yield suite
+        # Only outputs read up to their end are cached
+        self._store(digest, writer.frames)
+
+    def _lookup(self, path):
+        """ Return the path of the entry of an output (`None` if not cached) and its digest (`None` if not cacheable)
+        """
+        if path == STDIN or self.max_bytes <= 0:
+            return None, None
+        stat = os.stat(path)
+        if stat.st_size < self.min_size:
+            return None, None
+        real_path = os.path.realpath(path)
+        index = self._read_index()
+        known = index.get(real_path)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            digest = known[2]
+        else:
+            digest = _file_digest(path)
+            index[real_path] = [stat.st_size, stat.st_mtime_ns, digest]
+            self._write_index(index)
+        entry = self._entry_path(digest)
+        try:
+            os.utime(entry)    # Most recently used
+        except OSError:
+            self.misses += 1
+            logging.debug('Results of "%s" not cached', path)
+            return None, digest
+        self.hits += 1
+        logging.debug('Results of "%s" read from cache', path)
+        return entry, digest
+
+    def _entry_path(self, digest):
+        """ Return the path of the entry of a digest """
+        return os.path.join(self.directory, '{}-{}-{}.bin'.format(digest, PARSER_VERSION, marshal.version))
+
+    def _store(self, digest, frames):
+        """ Save an entry, then evict the least recently used entries beyond the size limit """
+        size = len(_MAGIC) + sum(len(frame) for frame in frames)
+        if size > self.max_bytes:
+            return
+        _write_file(self._entry_path(digest), [_MAGIC] + frames)
+        self._evict()
+
+    def _evict(self):
+        """ Remove the least recently used entries beyond the size limit """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:    # Removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _read_index(self):
+        """ Return the index: path of output -> [size, modification time, digest] """
+        try:
+            with open(os.path.join(self.directory, _INDEX_FILE), encoding='UTF-8') as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):    # No index, or corrupted
+            return {}
+
+    def _write_index(self, index):
+        """ Save the index, without the outputs removed since """
+        index = {path: known for path, known in index.items() if os.path.exists(path)}
+        _write_file(os.path.join(self.directory, _INDEX_FILE), [json.dumps(index).encode('UTF-8')])
+
+
+def _write_file(path, chunks):
+    """ Write a file at once: other processes read the previous file or the new one, never a partial file """
+    import tempfile    # Slow to import: only needed when writing
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.writelines(chunks)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _file_digest(path):
+    """ Return the SHA-256 digest of the content of a file """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as output_file:
+        for chunk in iter(lambda: output_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _EntryWriter(object):
+    """ Frames of an entry, from the suites read """
+
+    def __init__(self):
+        """ Init """
+        self.frames = []
+        self._indexes = {}    # id of started suite not ended -> index
+        self._started = 0
+
+    def add_read_suite(self, suite):
+        """ Add a suite yielded by `robot_results.iter_suites`: start of its parents and of itself if not started yet,
+            then its end
+        """
+        self._start(suite)
+        self._end(self._indexes.pop(id(suite)), suite)
+
+    def add_tree(self, suite):
+        """ Add a suite and its child suites """
+        self._start(suite)
+        for child in suite.suites:
+            self.add_tree(child)
+        self._end(self._indexes.pop(id(suite)), suite)
+
+    def _start(self, suite):
+        """ Add the start of a suite and of its parents, if not started yet """
+        if id(suite) in self._indexes:
+            return
+        parent_index = -1
+        if suite.parent is not None:
+            self._start(suite.parent)
+            parent_index = self._indexes[id(suite.parent)]
+        self._indexes[id(suite)] = self._started
+        self._started += 1
+        self._add((_SUITE_START, parent_index, suite.name))
+
+    def _end(self, index, suite):
+        """ Add the end of a suite """
+        self._add((_SUITE_END, index, list(suite.metadata.items()), [_test_fields(test) for test in suite.tests]))
+
+    def _add(self, event):
+        """ Add the frame of an event """
+        data = marshal.dumps(event)
+        self.frames.append(_FRAME.pack(len(data)) + data)
+
+
+def _test_fields(test):
+    """ Return the fields of a `LightTest`: name, tags, status, message, start time (ISO format) and elapsed time
+        (seconds)
+    """
+    return (test.name, list(test.tags), test.status, test.message, test.start_time, test.elapsed_time)
+
+
+def _iter_entry(path, tree=False):
+    """ Yield the suites of an entry, as `robot_results.iter_suites`
+    :param tree: If True, suites hold their child suites, and are kept until the end of the entry
+    """
+    suites = {}
+    started = 0
+    with open(path, 'rb') as entry_file, mmap.mmap(entry_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('Bad result cache entry "{}"'.format(path))
+        position = len(_MAGIC)
+        while position < len(data):
+            size, = _FRAME.unpack_from(data, position)
+            position += _FRAME.size
+            event = marshal.loads(data[position:position + size])
+            position += size
+            if event[0] == _SUITE_START:
+                _, parent_index, name = event
+                suite = LightSuite(suites.get(parent_index))
+                suite.name = name
+                if tree and suite.parent is not None:
+                    suite.parent.suites.append(suite)
+                suites[started] = suite
+                started += 1
+            else:
+                _, index, metadata, tests = event
+                suite = suites[index] if tree else suites.pop(index)
+                suite.metadata = dict(metadata)
+                suite.tests = [_read_test(fields, suite) for fields in tests]
+                yield suite
+
+
+def _read_test(fields, suite):
+    """ Return the test of the fields returned by `_test_fields` """
+    test = LightTest(suite)
+    test.name, test.tags, test.status, test.message, test.start_time, test.elapsed_time = fields
+    return test
+
+
+def add_result_cache_arguments(parser):
+    """ Add result cache options to an `argparse` parser """
+    group = parser.add_argument_group('result cache')
+    group.add_argument(
+        '--result-cache-dir',
+        dest='result_cache_dir',
+        metavar='DIR',
+        help='Directory of the cache of results read from outputs. Default: ' + default_directory() + '.')
+    group.add_argument(
+        '--result-cache-size',
+        dest='result_cache_size',
+        metavar='MB',
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help='Maximum size of the cache of results read from outputs (0: no cache). Default: %(default)s.')
+    group.add_argument(
+        '--result-cache-min-size',
+        dest='result_cache_min_size',
+        metavar='MB',
+        type=float,
+        default=DEFAULT_MIN_SIZE / (1024 * 1024),
+        help='Minimum size of the outputs whose results are cached. Default: %(default)s.')
+
+
+def create_result_cache(arguments):
+    """ Return the cache configured by the options of `add_result_cache_arguments`. `None` if disabled. """
+    if arguments.result_cache_size <= 0:
+        return None
+    return ResultCache(arguments.result_cache_dir or default_directory(),
+                       int(arguments.result_cache_size * 1024 * 1024),
+                       int(arguments.result_cache_min_size * 1024 * 1024))
@@ -34,97 +34,134 @@ This module mainly uses the Testrail API and Robot API for data communication.
 """
 import os
 import datetime
+import fnmatch
 import configparser
 import logging 
 import argparse
+import api_cache
+import logging_utils
+import rate_limit
+import result_cache
 import testrail
 import sys
 import re
+import threading
+import time
 
-from colorama import Fore, Style, init
-from robot.api import ExecutionResult, ResultVisitor
-from testrail_utils import TestRailApiUtils
+from robot_model import TestFilter
+from robot_results import ResultSet, TemplateResult, add_record, get_duration, output_path
+from scheduler import DEFAULT_MAX_WORKERS, TaskGraph
+from testrail_utils import SectionIndex, TestRailApiUtils
 
 PATH = os.getcwd()
 
-COMMENT_SIZE_LIMIT = 1000
+TESTCASE_LOG = logging_utils.get_testcase_logger()
 
-# Configure the logging
-LOG_FORMAT = '%(asctime)-15s %(levelname)-10s %(message)s'
-logging.basicConfig(filename=os.path.join(PATH, 'robotResult2Testrail.log'), format=LOG_FORMAT, level=logging.DEBUG)
-CONSOLE_HANDLER = logging.StreamHandler()
-CONSOLE_HANDLER.setLevel(logging.DEBUG)
-CONSOLE_HANDLER.setFormatter(logging.Formatter('%(message)s'))
-logging.getLogger().addHandler(CONSOLE_HANDLER)
+# Maximum number of results published in one request
+RESULTS_CHUNK_SIZE = 100
 
-class TestRailResultVisitor(ResultVisitor):
-    """ Implement a `Visitor` that retrieves TestRail Tags, Test Suite and Test Case Data from Robot Framework Result """
+# Tests that may be published: tests of suites with metadata UPLOAD_TO_TESTRAIL, or of their child suites. Other tests
+# are dropped while outputs are read.
+UPLOADED_TESTS = TestFilter(suite_metadata=('UPLOAD_TO_TESTRAIL', ), inherited=True)
+
+class TestRailResultVisitor(object):
+    """ Implement a `Visitor` that retrieves TestRail Tags, Test Suite and Test Case Data from Robot Framework Result 
+        Suites are visited children first, like Robot Framework `ResultVisitor`, but keywords are never walked.
+    """
     
     def __init__(self):
         """ Init, list of suites and test cases, to be stored when suite data is retrieved  """
         self.suite_list = []
         self.testcase_list=[]
+        # Number of the rerun output visited (0: original output). `None` when outputs are not merged.
+        self.rerun = None
+        self.rerun_note = False
+        self._suite_positions = {}
+        self._positions = {}
+
+    def visit_suite(self, suite):
+        """ Visit `suite` and its child suites """
+        for child_suite in suite.suites:
+            self.visit_suite(child_suite)
+        self.end_suite(suite)
 
     def end_suite(self, suite):
         """ Called when suite end """
         for s, t in self._get_testsuites(suite):
             self._append_testrail_suite(s, t)
 
+    @staticmethod
+    def _is_uploaded(suite):
+        """ Return True if test suite has a metadata tag UPLOAD_TO_TESTRAIL """
+        return any(metadata == 'UPLOAD_TO_TESTRAIL' for metadata in suite.metadata)
+
     @staticmethod
     def _get_testsuites(suite):
         """ Retrieve list of test suites and their test cases 
+            Test cases are given with the path of their section: names of the child suites they belong to,
+            `()` for test cases of the suite itself.
         """
         result = []
     
         # if test suite has a metadata tag UPLOAD_TO_TESTRAIL, parse all test suites and cases 
-        for metadata in suite.metadata:
-            if metadata == 'UPLOAD_TO_TESTRAIL':
-                testcases = suite.tests
-                result.append((suite, testcases))
-                logging.debug("Metadata UPLOAD_TO_TESTRAIL identified. Robot Test Suite Data Ready To Be Uploaded From %s.py ", str(suite.name))
+        if TestRailResultVisitor._is_uploaded(suite):
+            testcases = [(test, ()) for test in suite.tests]
+            testcases += TestRailResultVisitor._get_nested_testcases(suite, ())
+            result.append((suite, testcases))
+            logging.debug("Metadata UPLOAD_TO_TESTRAIL identified. "
+                          "Robot Test Suite Data Ready To Be Uploaded From %s.py ", str(suite.name))
        
         return result
 
+    @staticmethod
+    def _get_nested_testcases(suite, section):
+        """ Retrieve test cases of child suites with their section path. 
+            Child suites having their own UPLOAD_TO_TESTRAIL metadata are uploaded as separate test suites.
+        """
+        result = []
+        for child_suite in suite.suites:
+            if TestRailResultVisitor._is_uploaded(child_suite):
+                continue
+            child_section = section + (child_suite.name,)
+            result += [(test, child_section) for test in child_suite.tests]
+            result += TestRailResultVisitor._get_nested_testcases(child_suite, child_section)
+        return result
+
     def _append_testrail_suite(self, suite, testcases):
         """ Append and format test suite and case data in Testrail specific 
             JSON formatting 
         """
         suitename = suite.name
-        self.suite_list.append({
-            'name' : suitename
-        })  
+        if self.rerun is None:
+            self.suite_list.append({
+                'name' : suitename
+            })  
+        else:
+            add_record(self.suite_list, self._suite_positions, suite.longname, {'name': suitename})
         
-        for test in testcases:
-            
-            test_name = test.name
-            test_current_status = test.status
-            comment = None
-            if test.message:
-                comment = test.message
-                # Indent text to avoid string formatting by TestRail. Limit size of comment.
-                comment = "# Robot Framework result: #\n    " + comment[:COMMENT_SIZE_LIMIT].replace('\n', '\n    ')
-                comment += '\n...\nLog truncated' if len(str(comment)) > COMMENT_SIZE_LIMIT else ''
-            duration = 0
-            if test.starttime and test.endtime:
-                td_duration = datetime.datetime.strptime(test.endtime + '000', '%Y%m%d %H:%M:%S.%f')\
-                            - datetime.datetime.strptime(test.starttime + '000', '%Y%m%d %H:%M:%S.%f')
-                duration = round(td_duration.total_seconds())
-                duration = 1 if (duration < 1) else duration    # TestRail API doesn't manage msec (min value=1s)
-            
-            
-            self.testcase_list.append({
-                'title': test_name, 
-                'suite_name': suitename,
-                'status': test_current_status, 
-                'comment': comment,
-                'duration': duration
-            })
-
-def get_result_data(xml_robot_output):
-    """ Creates a result visitor from Robot API and accesses data from last Robot test run  """
-    result = ExecutionResult(xml_robot_output)
-    visitor = TestRailResultVisitor()
-    result.visit(visitor)
+        for test, section in testcases:
+            record = TemplateResult(test.name, suitename, section, test.status, duration=get_duration(test),
+                                    message=test.message)
+            if self.rerun is None:
+                self.testcase_list.append(record)
+            else:
+                #a result of a rerun replaces the previous result of the test
+                if self.rerun_note:
+                    record.rerun = self.rerun
+                add_record(self.testcase_list, self._positions, test.longname, record)
+
+def get_result_data(xml_robot_output, rerun_outputs=(), rerun_note=False, cache=None):
+    """ Creates a result visitor from Robot API and accesses data from last Robot test run  
+        Outputs may be XML or JSON, compressed, '-' is stdin. Outputs of reruns (`robot --rerunfailed`) are merged in
+        the same pass: the last result of a test is kept, optionally with a note in its comment. With a
+        `result_cache.ResultCache`, an output already read is not parsed again.
+    """
+    return get_result_data_from_results(
+        ResultSet.read(xml_robot_output, rerun_outputs, rerun_note, cache, test_filter=UPLOADED_TESTS))
+
+def get_result_data_from_results(result_set):
+    """ Return the test suites and test cases of a `ResultSet`, as returned by `get_result_data` """
+    visitor = result_set.visit(TestRailResultVisitor())
     return visitor.suite_list, visitor.testcase_list
 
 def get_rid(tc):
@@ -143,6 +180,10 @@ def get_robot_tc_ids(testcases):
     
     return tc_ids
 
+def get_section_id(suite, test):
+    """ Return the ID of the Testrail section of a Robot test case, within the Testrail suite """
+    return suite.get('section_ids', {}).get(test.get('section', ()), suite['section_id'])
+
 def update_test_cases(api, tr_testcases, r_testcases, suite): 
     """ Updates existing/adds test cases on Testrail 
         :param api: Client to TestRail API
@@ -152,113 +193,274 @@ def update_test_cases(api, tr_testcases, r_testcases, suite):
     """
     
     if r_testcases: 
+        robot_ids_on_tr = get_robot_tc_ids(tr_testcases) if tr_testcases else {}
         for rtest in r_testcases: 
             if rtest['suite_name'] == suite['name']: 
                 data = {'title':rtest['title']}
-                if tr_testcases: 
-                    robot_id = get_rid(rtest['title'])
-                    robot_ids_on_tr = get_robot_tc_ids(tr_testcases)
-                    
-                    if robot_id in robot_ids_on_tr:
-                        rtest['id'] = api.update_case(robot_ids_on_tr[robot_id], data)['id']
-                        #logging.info("    Updating Test Case #%d", robot_ids_on_tr[robot_id])
-                    else: 
-                        rtest['id'] = api.add_case(suite['section_id'],data)['id']
-                        logging.info("    Adding New Test Case #%s", rtest['title'])
-                        
+                robot_id = get_rid(rtest['title'])
+                
+                if robot_id in robot_ids_on_tr:
+                    rtest['id'] = api.update_case(robot_ids_on_tr[robot_id], data)['id']
+                    #logging.info("    Updating Test Case #%d", robot_ids_on_tr[robot_id])
                 else: 
-                    rtest['id'] = api.add_case(suite['section_id'],data)['id']
-                    logging.info("    Adding New Test Case #%s", rtest['title'])
+                    rtest['id'] = api.add_case(get_section_id(suite, rtest),data)['id']
+                    TESTCASE_LOG.info("    Adding New Test Case #%s", rtest['title'])
     else: 
         logging.info('    There Are No Robot Test Cases Available To Add/Update To Testrail Suite #%s', suite['name'])
         
-def update_robot_suites(api, testsuites, testcases, pid):
+def index_suites_by_name(tr_testsuites):
+    """ Index Testrail test suites by name 
+        :param tr_testsuites: List of test suites returned by Testrail
+        :return: Dict name -> test suite. When several suites share a name, the first one listed is kept.
+    """
+    index = {}
+    for tr_suite in tr_testsuites:
+        kept_suite = index.setdefault(tr_suite['name'], tr_suite)
+        if kept_suite is not tr_suite:
+            logging.warning('Several Testrail Test Suites are named %s: #%d is updated, #%d is ignored',
+                            tr_suite['name'], kept_suite['id'], tr_suite['id'])
+    return index
+
+def group_testcases_by_suite(testcases):
+    """ Return dict Robot test suite name -> list of its test cases """
+    testcases_by_suite = {}
+    for test in testcases:
+        testcases_by_suite.setdefault(test['suite_name'], []).append(test)
+    return testcases_by_suite
+
+def update_robot_suite(api, suite, testcases, pid, tr_testsuites):
+    """ Updates existing/add one test suite, its sections and its test cases on Testrail 
+        :param api: Client to TestRail API
+        :param suite: Test suite from Robot Framework 
+        :param testcases: List of test cases of the test suite
+        :param pid: Testrail project ID test suite is being updated/published to
+        :param tr_testsuites: Dict name -> test suite existing in Testrail project
+    """
+    existing_suite = tr_testsuites.get(suite['name'])
+    
+    if existing_suite: 
+        #update test suite 
+        suite['id'] = api.update_suite(existing_suite['id'], suite)['id']
+        suiteid = suite['id']
+        #sections fetched once per suite
+        sections = SectionIndex.load(api, pid, suiteid)
+        logging.info("Updating Testrail Test Suite #%d %s", suiteid, suite['name'])
+        
+    else:
+        #add new test suite, without any section yet
+        suite['id'] = api.add_suite(pid, suite)['id']
+        suiteid = suite['id']
+        #next Robot test suites of the same name (run after this one) update it
+        tr_testsuites[suite['name']] = {'id': suiteid, 'name': suite['name']}
+        sections = SectionIndex(api, pid, suiteid)
+        logging.info("Adding New Testrail Test Suite #%d %s", suiteid, suite['name'])
+    
+    #map nested Robot suites to sections, root section for tests of the suite itself
+    sections.ensure(test.get('section', ()) for test in testcases)
+    suite['section_id'] = sections[()]
+    suite['section_ids'] = sections.as_dict()
+    
+    #add/update test cases to suite, only id and title of existing cases are needed
+    update_test_cases(api, list(api.iter_cases(pid, suiteid, fields=('id', 'title'))), testcases, suite)
+
+def add_robot_suites_tasks(graph, api, testsuites, testcases, pid):
+    """ Add to a task graph one task per test suite, updating/adding it and its test cases on Testrail 
+        Tasks of Robot test suites sharing a name (so the same Testrail suite) run one after the other.
+        :return: List of task names, in the order of `testsuites`
+    """
+    tr_testsuites = index_suites_by_name(api.get_suites(pid) or [])
+    logging.info('Retrieving List of Test Suites from Project #%d', pid)
+    testcases_by_suite = group_testcases_by_suite(testcases)
+    
+    tasks = []
+    last_task_by_name = {}
+    for index, suite in enumerate(testsuites):
+        depends_on = [last_task_by_name[suite['name']]] if suite['name'] in last_task_by_name else []
+        task = graph.add('Robot Test Suite #%d %s' % (index + 1, suite['name']), update_robot_suite, api, suite, 
+                         testcases_by_suite.get(suite['name'], []), pid, tr_testsuites, depends_on=depends_on)
+        last_task_by_name[suite['name']] = task
+        tasks.append(task)
+    return tasks
+
+def update_robot_suites(api, testsuites, testcases, pid, max_workers=DEFAULT_MAX_WORKERS):
     """ Updates existing/add test suites and their test cases on Testrail 
+        Test suites are updated concurrently.
         :param api: Client to TestRail API
         :param testsuites: List of test suites from Robot Framework 
         :param testcases: List of test cases belonging to each test suite from Robot Framework
         :param pid: Testrail project ID test suites are being updated/published to
+        :param max_workers: Maximum number of test suites updated at the same time
         :return: True if updating was done. False in case of error.
     """ 
     
-    tr_testsuites_list = api.get_suites(pid)
-    logging.info('Retrieving List of Test Suites from Project #%d', pid)
-        
     #add/update test suites
-    if testsuites:
-        
-        isExisting = 0 
-        
-        for suite in testsuites:
-            for d in tr_testsuites_list:
-                if suite.items() <= d.items():
-                    isExisting = 1 
-                    break
-            
-            if isExisting: 
-                #update test suite 
-                suite['id'] = api.update_suite(d['id'], suite)['id']
-                suiteid = suite['id']
-                #leave section name blank 
-                data = {'name':'', 'suite_id': suiteid}
-                sectionid = api.get_sections(pid, suiteid)[0]['id']
-                #api.delete_section(sectionid)
-                suite['section_id']= sectionid 
-                logging.info("Updating Testrail Test Suite #%d %s", suiteid, suite['name'])
-                
-            else:
-                #add new test suite 
-                suite['id'] = api.add_suite(pid, suite)['id']
-                suiteid = suite['id']
-                data = {'name':'section', 'suite_id': suiteid}
-                suite['section_id'] = api.add_section(pid, data)['id']
-                logging.info("Adding New Testrail Test Suite #%d %s", suiteid, suite['name'])
-            
-            #add/update test cases to suite
-            update_test_cases(api, api.get_cases(pid, suiteid), testcases, suite)
-
-    else: 
+    if not testsuites: 
         logging.info('There Are No Robot Test Suites Available to Publish To Testrail Project #%d', pid)
         return False   
     
-    return True  
+    graph = TaskGraph(max_workers)
+    add_robot_suites_tasks(graph, api, testsuites, testcases, pid)
+    return graph.run()
+
+def add_testplan(api, pid, plan, name=None):
+    """ Creates a new test plan on Testrail, `plan` dict is updated with its name and ID 
+        :param name: Name of the test plan, '*' is replaced by the date. Default: "Test Plan <date>".
+    """
+    plan['name'] = (name or "Test Plan *").replace('*', str(datetime.datetime.now()))
+    plan['id'] = api.add_plan(pid, {'name': plan['name']})['id']
+    plan['entries'] = {}
+    logging.info("Creating A New Testrail Test Plan %s For Project #%d...", plan['name'], pid)
+
+def open_testplan(api, pid, plan, plan_id=None, name=None, rotate_after=None):
+    """ Opens the test plan results are published in, `plan` dict is updated with its name, ID and entries
+        :param api: Client to TestRail API
+        :param pid: Testrail project ID
+        :param plan: Test plan dict to update. `entries` is a dict suite ID -> entry with available test runs.
+        :param plan_id: ID of an open test plan to append results to
+        :param name: Name pattern (`fnmatch`) of an open test plan to append results to: the latest open test plan
+                     matching is used, or a new one is created, named after the pattern with '*' replaced by the date.
+                     Only '*' may be used: the name of a created test plan matches the pattern.
+        :param rotate_after: Age in hours after which the test plan found by name is closed, and a new one created
+    """
+    if plan_id:
+        if not api.is_testplan_available(plan_id):
+            raise testrail.APIError('Test Plan #%d is not available' % plan_id)
+        found = {'id': plan_id, 'name': 'Test Plan #%d' % plan_id}
+    elif name:
+        found = max(
+            (open_plan for open_plan in api.iter_open_plans(pid, fields=('id', 'name', 'created_on'))
+             if fnmatch.fnmatchcase(open_plan['name'], name)),
+            key=lambda open_plan: open_plan['created_on'], default=None)
+        if found and rotate_after is not None and time.time() - found['created_on'] > rotate_after * 3600:
+            logging.info("Closing Testrail Test Plan #%d %s, Opened More Than %s Hours Ago", found['id'], 
+                         found['name'], rotate_after)
+            api.close_plan(found['id'])
+            found = None
+    else:
+        found = None
+    if found is None:
+        add_testplan(api, pid, plan, name)
+        return
+    plan['id'] = found['id']
+    plan['name'] = found['name']
+    plan['entries'] = {entry['suite_id']: entry for entry in api.get_available_entries(found['id'])}
+    logging.info("Appending To Testrail Test Plan #%d %s (%d Test Runs)", plan['id'], plan['name'], 
+                 len(plan['entries']))
 
-def create_testrail_testplan(api, testsuites, testcases, pid):
-    """ Creates new test plan on Testrail and uploads Robot results to it 
+def add_suite_run(api, plan, suite, case_ids):
+    """ Returns the ID of the test run of a test suite in a test plan, including the test cases `case_ids`
+        The test run of an existing entry is reused, and extended with the test cases it doesn't include. Otherwise a
+        new entry is added.
+        Robot results don't tell their configuration: of an entry with configurations (several test runs), only the
+        first open test run is used.
+    """
+    entry = plan['entries'].get(suite['id'])
+    if entry is None:
+        data = {'suite_id': suite['id'], 'include_all': False, 'case_ids': case_ids}
+        entry = api.add_plan_entry(plan['id'], data)
+        plan['entries'][suite['id']] = entry
+        run_id = entry['runs'][0]['id']
+        logging.info("    Adding Suite #%d %s to New Test Run #%d (%d Test Cases)", suite['id'], suite['name'], run_id,
+                     len(case_ids))
+        return run_id
+
+    run = entry['runs'][0]
+    if len(entry['runs']) > 1:
+        logging.warning("    Entry Of Suite #%d %s Has %d Open Test Runs (Configurations): Only Test Run #%d Is Used", 
+                        suite['id'], suite['name'], len(entry['runs']), run['id'])
+    if not run.get('include_all'):
+        included = [test['case_id'] for test in api.iter_tests(run['id'], fields=('case_id', ))]
+        included_set = set(included)
+        missing = [case_id for case_id in case_ids if case_id not in included_set]
+        if missing:
+            api.update_plan_entry(plan['id'], entry['id'], {'include_all': False, 'case_ids': included + missing})
+    logging.info("    Adding Suite #%d %s to Existing Test Run #%d", suite['id'], suite['name'], run['id'])
+    return run['id']
+
+def publish_suite_results(api, plan, suite, testcases, chunk_size=RESULTS_CHUNK_SIZE):
+    """ Adds a test run of a test suite to a test plan, and publishes results of the test suite in it
+        The test run only includes the test cases of the results (their IDs are set by `update_test_cases`), so that
+        its size is the number of tests executed, not the number of test cases of the suite.
+        :param api: Client to TestRail API
+        :param plan: Test plan, opened by `open_testplan`
+        :param suite: Test suite from Robot Framework, updated on Testrail by `update_robot_suite`
+        :param testcases: List of test cases of the test suite
+        :param chunk_size: Maximum number of results published in one request
+    """
+    count = 0 
+    run_id = add_suite_run(api, plan, suite, list(dict.fromkeys(test['id'] for test in testcases)))
+    for start in range(0, len(testcases), chunk_size):
+        chunk = testcases[start:start + chunk_size]
+        try:
+            api.add_results(run_id, chunk)
+        except testrail.APIError as error:
+            logging.warning('    Results Not Published At Once In Test Run #%d (%s): Publishing Them One By One',
+                            run_id, error)
+            for test in chunk:
+                api.add_result_alt(run_id, test)
+        for test in chunk:
+            count += 1 
+            TESTCASE_LOG.info("        Adding Test Case #%d %s", test['id'], test['title'])
+    logging.info('Added %d Test Case Results For Robot Test Suite %s into Test Plan %s', count, suite['name'], 
+                 plan['name'])
+
+def create_testrail_testplan(api, testsuites, testcases, pid, max_workers=DEFAULT_MAX_WORKERS, plan_id=None, 
+                             plan_name=None, rotate_after=None):
+    """ Creates new test plan on Testrail, or opens an existing one, and uploads Robot results to it 
+        Each test suite is updated then published in the test plan, independently of (and concurrently with) other
+        test suites: a failure only stops the test suite concerned.
+        The test plan is opened by the first test run published, once its test suite is updated: no test plan is
+        created (or closed by rotation) if all test suites fail.
         :param api: Client to TestRail API
         :param testsuites: List of test suites from Robot Framework 
         :param testcases: List of test cases belonging to each test suite from Robot Framework
         :param pid: Testrail project ID test suites are being updated/published to
+        :param max_workers: Maximum number of tasks (test suite update, test run publication) at the same time
+        :param plan_id: ID of an open test plan to append results to, see `open_testplan`
+        :param plan_name: Name pattern of an open test plan to append results to, see `open_testplan`
+        :param rotate_after: Age in hours after which the test plan found by name is replaced, see `open_testplan`
         :return: True if publishing was done. False in case of error.
     """ 
     
+    if not testsuites: 
+        logging.info('There Are No Robot Test Suites Available to Publish To Testrail Project #%d', pid)
+        logging.debug('Could Not Create Testrail Test Plan For Project  #%d', pid)
+        return False 
+    
     try: 
-        if update_robot_suites(api, testsuites, testcases, pid): 
-            name = "Test Plan " + str(datetime.datetime.now())
-            data_init = {'name': name}
-            plan_id = api.add_plan(pid, data_init)['id']
-            logging.info("Creating A New Testrail Test Plan %s For Project #%d...", name, pid)
-            
-            for suite in testsuites: 
-                count = 0 
-                data = {'suite_id':suite['id']}
-                run_id = api.add_plan_entry(plan_id, data)['runs'][0]['id']
-                logging.info("    Adding Suite #%d %s to New Test Run #%d", suite['id'], suite['name'], run_id)
-                for test in testcases: 
-                    if test['suite_name'] == suite['name']:
-                        api.add_result_alt(run_id, test)
-                        count += 1 
-                        logging.info("        Adding Test Case #%d %s", test['id'], test['title'])
-                logging.info('Added %d Test Case Results For Robot Test Suite %s into Test Plan %s', count, suite['name'], name)
-            
-            logging.info('Finished Publishing Results to Test Plan %s!', name)
-        else: 
-            logging.debug('Could Not Create Testrail Test Plan For Project  #%d', pid)
-            return False 
+        graph = TaskGraph(max_workers)
+        suite_tasks = add_robot_suites_tasks(graph, api, testsuites, testcases, pid)
+        plan = {}
+        plan_lock = threading.Lock()
+
+        def publish_suite(suite, suite_testcases):
+            """ Opens the test plan unless a test run already did, then publishes results of a test suite in it """
+            with plan_lock:
+                if not plan:
+                    opened = {}
+                    open_testplan(api, pid, opened, plan_id, plan_name, rotate_after)
+                    plan.update(opened)
+            publish_suite_results(api, plan, suite, suite_testcases)
+
+        testcases_by_suite = group_testcases_by_suite(testcases)
+        last_run_by_name = {}
+        for suite, suite_task in zip(testsuites, suite_tasks):
+            #test runs of Robot test suites sharing a name (so the same plan entry) are published one after the other
+            depends_on = [suite_task] + ([last_run_by_name[suite['name']]] if suite['name'] in last_run_by_name else [])
+            last_run_by_name[suite['name']] = graph.add('Test Run of ' + suite_task, publish_suite, suite, 
+                                                        testcases_by_suite.get(suite['name'], []), 
+                                                        depends_on=depends_on)
     except testrail.APIError as error: 
         logging.error('Could Not Create Testrail Test Plan For Project #%d - Testrail API Error - %s', pid, str(error))
-        
-    return True 
+        return False
+    
+    if graph.run():
+        logging.info('Finished Publishing Results to Test Plan %s!', plan['name'])
+        return True
+    
+    logging.error('Results Partially Published For Project #%d: %d Task(s) Failed, %d Skipped', pid, 
+                  len(graph.failed), len(graph.skipped))
+    return False 
               
 def options():
     
@@ -266,9 +468,10 @@ def options():
     parser = argparse.ArgumentParser(prog='robotResult2Testrail.py', description=__doc__)
     parser.add_argument(
         'xml_robot_output',
-        nargs=1,
-        type=argparse.FileType('r', encoding='UTF-8'),
-        help='XML output results of Robot Framework')
+        nargs='+',
+        type=output_path,
+        help='XML output results of Robot Framework, followed by outputs of reruns (--rerunfailed) if any. '
+        'May be compressed (gzip, bzip2, xz, zstandard). "-" for stdin.')
     parser.add_argument(
         '--tr-config',
         dest='config',
@@ -288,15 +491,62 @@ def options():
         type=int,
         default=None,
         help='Identifier of Project, that appears in TestRail.')
+    plan_group = parser.add_mutually_exclusive_group()
+    plan_group.add_argument(
+        '--tr-plan-id',
+        dest='plan_id',
+        metavar='ID',
+        type=int,
+        help='Identifier of an open Test Plan to append results to, instead of creating a new Test Plan.')
+    plan_group.add_argument(
+        '--tr-plan-name',
+        dest='plan_name',
+        metavar='PATTERN',
+        help='Name pattern of the open Test Plan to append results to, such as "Nightly *": the latest open Test Plan '
+        'matching is used. If none, a Test Plan is created, named after the pattern with "*" replaced by the date. '
+        'Only "*" may be used as wildcard.')
+    parser.add_argument(
+        '--tr-plan-rotate',
+        dest='rotate_after',
+        metavar='HOURS',
+        type=float,
+        help='With --tr-plan-name, close the Test Plan found if it was created more than HOURS hours ago, and create '
+        'a new one.')
+    parser.add_argument(
+        '--tr-max-workers',
+        dest='max_workers',
+        metavar='N',
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help='Maximum number of test suites published at the same time. Default: %(default)s.')
+    rate_limit.add_rate_arguments(parser)
+    parser.add_argument(
+        '--rerun-note', 
+        action='store_true', 
+        help='Note in comment of results coming from a rerun output.')
+    api_cache.add_cache_arguments(parser)
+    result_cache.add_result_cache_arguments(parser)
+    logging_utils.add_logging_arguments(parser)
 
     opt = parser.parse_known_args()
     if opt[1]:
         logging.warning('Unknown options: %s', opt[1])
+    if opt[0].rotate_after is not None and not opt[0].plan_name:
+        parser.error('--tr-plan-rotate requires --tr-plan-name')
+    if opt[0].plan_name and any(char in opt[0].plan_name for char in '?[]'):
+        # Created test plans are named after the pattern: they wouldn't match it
+        parser.error('--tr-plan-name: only "*" may be used as wildcard')
     return opt[0]
    
 def uploadResults():
     
     ARGUMENTS = options()
+    logging_utils.configure_logging(
+        ARGUMENTS.log_file or os.path.join(PATH, 'robotResult2Testrail.log'),
+        max_bytes=ARGUMENTS.log_max_bytes,
+        backup_count=ARGUMENTS.log_backup_count,
+        sample_rate=ARGUMENTS.log_sample,
+        summary_only=ARGUMENTS.log_summary_only)
     CONFIG = configparser.ConfigParser()
     CONFIG.read_file(ARGUMENTS.config)
     URL = CONFIG.get('API', 'url')
@@ -309,13 +559,20 @@ def uploadResults():
     API = TestRailApiUtils(URL)
     API.user = EMAIL
     API.password = PASSWORD
+    API.cache = api_cache.create_cache(ARGUMENTS)
+    API.rate_limiter = rate_limit.create_rate_limiter(ARGUMENTS, URL)
     
-    data = get_result_data(ARGUMENTS.xml_robot_output[0].name)
+    data = get_result_data(ARGUMENTS.xml_robot_output[0], 
+                           rerun_outputs=ARGUMENTS.xml_robot_output[1:],
+                           rerun_note=ARGUMENTS.rerun_note,
+                           cache=result_cache.create_result_cache(ARGUMENTS))
     
     TESTSUITES = data[0]
     TESTCASES = data[1]
 
-    if create_testrail_testplan(API, TESTSUITES, TESTCASES, pid=ARGUMENTS.pid): 
+    if create_testrail_testplan(API, TESTSUITES, TESTCASES, pid=ARGUMENTS.pid, max_workers=ARGUMENTS.max_workers, 
+                                plan_id=ARGUMENTS.plan_id, plan_name=ARGUMENTS.plan_name, 
+                                rotate_after=ARGUMENTS.rotate_after): 
         sys.exit()
     else: 
         sys.exit(1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Fast reader of Robot Framework JSON outputs (`robot --output output.json`)
+
+    The output is read as a stream and only the suite and test fields needed to publish results are kept: keyword
+    bodies, setups and teardowns (most of an output) are dropped as soon as decoded, and no Robot Framework result
+    model is built.
+    Metadata of a suite comes before its tests, and tags of a test before its body: with a `robot_model.TestFilter`,
+    a test not selected is dropped once its tags are read, and tests of a suite that none can select are discarded
+    without building their records.
+"""
+from json_stream import JsonReader
+from robot_model import LightSuite, LightTest
+
+# Members kept, by object. Other members are discarded.
+SUITE_FIELDS = ('name', 'metadata')
+TEST_FIELDS = ('name', 'tags', 'status', 'message', 'start_time', 'elapsed_time')
+
+
+def read_json_output(stream, test_filter=None):
+    """ Read the top level suite of a Robot Framework JSON output
+    :param stream: Binary file-like object of the output
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests.
+    :return: `LightSuite`
+    """
+    suite = None
+    for suite in _iter_suites(stream, True, test_filter):
+        pass
+    return suite
+
+
+def iter_json_suites(stream, test_filter=None):
+    """ Yield the suites of a Robot Framework JSON output as they are read, child suites before their parent
+
+        Suites yielded hold their tests, but not their child suites (already yielded): the output is never held in
+        memory.
+    :param stream: Binary file-like object of the output
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests.
+    """
+    return _iter_suites(stream, False, test_filter)
+
+
+def _iter_suites(stream, attach, test_filter):
+    """ Yield the suites of an output, child suites before their parent
+    :param attach: If True, child suites are added to their parent
+    """
+    reader = JsonReader(stream)
+    found = False
+    for member in reader.iter_members():
+        if member == 'suite':
+            found = True
+            for suite in _iter_suite(reader, None, attach, test_filter):
+                yield suite
+        else:
+            reader.discard_value()
+    if not found:
+        raise ValueError('Invalid Robot Framework JSON output: no suite')
+
+
+def _iter_suite(reader, parent, attach, test_filter):
+    """ Read next suite, yielding its child suites then the suite """
+    suite = LightSuite(parent)
+    for member in reader.iter_members():
+        if member in SUITE_FIELDS:
+            setattr(suite, member, reader.decode_value())
+        elif member == 'suites':
+            for _ in reader.iter_items():
+                for child_suite in _iter_suite(reader, suite, attach, test_filter):
+                    yield child_suite
+                if attach:
+                    suite.suites.append(child_suite)
+        elif member == 'tests':
+            suite.tests = _read_tests(reader, suite, test_filter)
+        else:
+            reader.discard_value()
+    yield suite
+
+
+def _read_tests(reader, suite, test_filter):
+    """ Read the tests of a suite selected by `test_filter` """
+    if test_filter is None or test_filter.suite_matches(suite):
+        return [_read_test(reader, suite) for _ in reader.iter_items()]
+    if test_filter.tag_regex is None:    # No test can be selected
+        reader.discard_value()
+        return []
+    tests = (_read_test(reader, suite, test_filter) for _ in reader.iter_items())
+    return [test for test in tests if test is not None]
+
+
+def _read_test(reader, parent, test_filter=None):
+    """ Read next test. `None` if not selected by the tags of `test_filter`: its fields after tags are discarded. """
+    test = LightTest(parent)
+    selected = None if test_filter is not None else True    # Unknown until tags are read
+    for member in reader.iter_members():
+        if member in TEST_FIELDS and selected is not False:
+            setattr(test, member, reader.decode_value())
+            if member == 'tags' and selected is None:
+                selected = test_filter.tags_match(test.tags)
+        else:
+            reader.discard_value()
+    return test if selected else None
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Lightweight suites and tests of Robot Framework outputs, read without Robot Framework result model
+
+    They only hold the fields needed to publish results, and expose the attributes of their Robot Framework
+    counterparts used by the result visitors. A `TestFilter` lets the readers drop the tests that won't be published.
+"""
+import datetime
+
+
+class LightSuite(object):
+    """ Suite of an output """
+    __slots__ = ('parent', 'name', 'metadata', 'suites', 'tests')
+
+    def __init__(self, parent=None):
+        """ Init """
+        self.parent = parent
+        self.name = ''
+        self.metadata = {}
+        self.suites = []
+        self.tests = []
+
+    @property
+    def longname(self):
+        """ Name of the suite prefixed by the names of its parents """
+        return self.name if self.parent is None else '{}.{}'.format(self.parent.longname, self.name)
+
+
+class LightTest(object):
+    """ Test of an output """
+    __slots__ = ('parent', 'name', 'tags', 'status', 'message', 'start_time', 'elapsed_time')
+
+    def __init__(self, parent):
+        """ Init """
+        self.parent = parent
+        self.name = ''
+        self.tags = ()
+        self.status = 'FAIL'
+        self.message = ''
+        self.start_time = None
+        self.elapsed_time = None
+
+    @property
+    def longname(self):
+        """ Name of the test prefixed by the names of its suites """
+        return '{}.{}'.format(self.parent.longname, self.name)
+
+    @property
+    def starttime(self):
+        """ Start time, `None` if unknown """
+        return self.start_time
+
+    @property
+    def endtime(self):
+        """ End time, `None` if unknown """
+        if self.start_time is None or self.elapsed_time is None:
+            return None
+        return (datetime.datetime.fromisoformat(self.start_time) +
+                datetime.timedelta(seconds=self.elapsed_time)).isoformat()
+
+    @property
+    def elapsedtime(self):
+        """ Elapsed time in milliseconds, rounded as Robot Framework does """
+        if self.elapsed_time is None:
+            return 0
+        return round(datetime.timedelta(seconds=self.elapsed_time).total_seconds() * 1000)
+
+
+class TestFilter(object):
+    """ Selection of the tests that may be published, evaluated by the readers while an output is read
+
+        A test is selected if its suite has one of `suite_metadata` (or one of its parent suites, if `inherited`), or
+        if one of its tags matches `tag_regex`. Tests not selected are dropped as soon as the readers can tell: their
+        other fields are not decoded, and they are never visited.
+    """
+    __test__ = False    # Not a test class for pytest
+
+    def __init__(self, suite_metadata=(), tag_regex=None, inherited=False):
+        """ Init
+        :param suite_metadata: Names of suite metadata selecting all the tests of the suite
+        :param tag_regex: Compiled regular expression of tags selecting a test, searched in tags. `None`: no tag.
+        :param inherited: If True, metadata of parent suites select the tests of their child suites too
+        """
+        self.suite_metadata = frozenset(suite_metadata)
+        self.tag_regex = tag_regex
+        self.inherited = inherited
+
+    def suite_matches(self, suite):
+        """ Return True if all the tests of `suite` are selected by metadata """
+        while suite is not None:
+            if not self.suite_metadata.isdisjoint(suite.metadata):
+                return True
+            suite = suite.parent if self.inherited else None
+        return False
+
+    def tags_match(self, tags):
+        """ Return True if a test with `tags` is selected by its tags """
+        return self.tag_regex is not None and any(self.tag_regex.search(tag) for tag in tags)
+
+    def __call__(self, test):
+        """ Return True if `test` is selected """
+        return self.tags_match(test.tags) or self.suite_matches(test.parent)
+
+
+def filter_tests(suite, test_filter, recursive=False):
+    """ Drop the tests of `suite` not selected by `test_filter`
+    :param recursive: If True, tests of child suites are filtered too
+    """
+    if not test_filter.suite_matches(suite):
+        suite.tests = [test for test in suite.tests if test_filter.tags_match(test.tags)]
+    if recursive:
+        for child_suite in suite.suites:
+            filter_tests(child_suite, test_filter, recursive)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Robot Framework outputs, and compact records of their test results
+
+    Outputs may be compressed (gzip, bzip2, xz, zstandard) or read from stdin: they are decompressed as a stream,
+    straight into the parser. JSON outputs are read by the reader of `robot_json`, XML outputs by the reader of
+    `robot_xml`: keyword bodies are never kept, and a `robot_model.TestFilter` drops the tests that won't be published
+    while the output is read.
+
+    One record is kept per test, possibly for hundreds of thousands of tests: records use `__slots__`, IDs are
+    integers parsed once and statuses are small integer codes. The Robot Framework message is kept (truncated) and
+    the TestRail comment is only built when read.
+    Records are read-only mappings, so that they can be used as the dicts they replace (`add_result`,
+    `pretty_print`, `str.format(**record)`).
+"""
+import argparse
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import sys
+from collections.abc import Mapping
+
+from robot_json import iter_json_suites, read_json_output
+from robot_xml import iter_xml_suites, read_xml_output
+
+COMMENT_SIZE_LIMIT = 1000
+
+STDIN = '-'
+
+# Magic numbers of compressed files
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Robot Framework statuses. Index in this tuple is the status code stored in records.
+ROBOT_STATUSES = ('PASS', 'FAIL', 'SKIP', 'NOT RUN')
+ROBOT_STATUS_CODES = {status: code for code, status in enumerate(ROBOT_STATUSES)}
+
+
+def output_path(value):
+    """ `argparse` type of a Robot Framework output: path of an existing file, or '-' for stdin """
+    if value != STDIN and not os.path.isfile(value):
+        raise argparse.ArgumentTypeError("can't open '{}': no such file".format(value))
+    return value
+
+
+@contextlib.contextmanager
+def open_output(path):
+    """ Open a Robot Framework output for reading, decompressing it on the fly if needed
+
+        Compression is detected from content, so that compressed data piped to stdin is managed too.
+        :param path: Path of the output, '-' for stdin
+        :return: Context manager giving a binary file object, supporting `peek`
+    """
+    raw = sys.stdin.buffer if path == STDIN else open(path, 'rb')
+    try:
+        head = raw.peek(len(XZ_MAGIC))
+        if head.startswith(GZIP_MAGIC):
+            stream = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif head.startswith(BZIP2_MAGIC):
+            stream = bz2.BZ2File(raw, mode='rb')
+        elif head.startswith(XZ_MAGIC):
+            stream = lzma.LZMAFile(raw, mode='rb')
+        elif head.startswith(ZSTD_MAGIC):
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError('Package "zstandard" is needed to read compressed output "{}"'.format(path))
+            stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=False))
+        else:
+            stream = raw
+        if stream is raw:
+            yield raw
+        else:
+            with stream:
+                yield stream
+    finally:
+        if path != STDIN:
+            raw.close()
+
+
+def is_json_output(stream):
+    """ Return True if the output read from `stream` (supporting `peek`) is a JSON output, False if XML """
+    return stream.peek(64).lstrip().startswith(b'{')
+
+
+def read_suite(stream, test_filter=None):
+    """ Return the top level suite of the Robot Framework output read from `stream`, opened by `open_output`
+
+        Keywords are not read. Suites are read without Robot Framework result model: only the attributes used by the
+        result visitors are available.
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests.
+    """
+    if is_json_output(stream):
+        return read_json_output(stream, test_filter)
+    return read_xml_output(stream, test_filter)
+
+
+def iter_suites(stream, test_filter=None):
+    """ Yield the suites of the Robot Framework output read from `stream`, opened by `open_output`, as they are read
+
+        Suites are yielded child suites first, with their tests but without their child suites, so that the output is
+        never held in memory.
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests.
+    """
+    if is_json_output(stream):
+        return iter_json_suites(stream, test_filter)
+    return iter_xml_suites(stream, test_filter)
+
+
+def iter_output_suites(path, cache=None, test_filter=None):
+    """ Yield the suites of the output of `path` as they are read, as `iter_suites`
+    :param cache: `result_cache.ResultCache` of the suites read, or `None`
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests.
+    """
+    if cache is not None:
+        yield from cache.iter_suites(path, test_filter)
+        return
+    with open_output(path) as stream:
+        yield from iter_suites(stream, test_filter)
+
+
+class ResultSet(object):
+    """ Suites of a Robot Framework output and of its reruns, read once
+
+        Each publisher visits the same suites with its own result visitor, so that an output published both by test
+        case ID and as TestRail templates is only parsed once.
+    """
+
+    def __init__(self, suites, rerun_note=False):
+        """ Init
+        :param suites: Top level suites of the output, then of its reruns (`robot --rerunfailed`), in order
+        :param rerun_note: If True, visitors note in comment that a result comes from a rerun
+        """
+        self.suites = list(suites)
+        self.rerun_note = rerun_note
+
+    @classmethod
+    def read(cls, output, rerun_outputs=(), rerun_note=False, cache=None, test_filter=None):
+        # pylint: disable=too-many-arguments
+        """ Read an output and its reruns
+        :param output: Path of the output (XML or JSON), possibly compressed. '-' for stdin.
+        :param rerun_outputs: Paths of the outputs of reruns, in order
+        :param rerun_note: If True, visitors note in comment that a result comes from a rerun
+        :param cache: `result_cache.ResultCache` of the suites read, or `None`
+        :param test_filter: `robot_model.TestFilter` of the tests to keep, when only one publisher visits the suites.
+                            `None`: all tests.
+        """
+        suites = []
+        for path in [output] + list(rerun_outputs):
+            if cache is not None:
+                suites.append(cache.read_suite(path, test_filter))
+                continue
+            with open_output(path) as stream:
+                suites.append(read_suite(stream, test_filter))
+        return cls(suites, rerun_note)
+
+    def visit(self, visitor):
+        """ Visit all suites with a result visitor. With reruns, the last result of a test replaces the previous ones.
+        :return: `visitor`
+        """
+        visitor.rerun_note = self.rerun_note
+        for rerun, suite in enumerate(self.suites):
+            if len(self.suites) > 1:
+                visitor.rerun = rerun
+            visitor.visit_suite(suite)
+        return visitor
+
+
+def format_comment(message, rerun=0):
+    """ Return the TestRail comment of a Robot Framework test message. `None` if there is no message.
+        :param rerun: Number of the rerun the result comes from, noted in comment. 0 for no note.
+    """
+    if not message and not rerun:
+        return None
+    comment = "# Robot Framework result: #"
+    if rerun:
+        comment += " (rerun #{})".format(rerun)
+    if message:
+        # Indent text to avoid string formatting by TestRail. Limit size of comment.
+        comment += "\n    " + message[:COMMENT_SIZE_LIMIT].replace('\n', '\n    ')
+        comment += '\n...\nLog truncated' if len(comment) > COMMENT_SIZE_LIMIT else ''
+    return comment
+
+
+def add_record(records, positions, key, record):
+    """ Append `record` to `records`, or replace the record of a previous attempt of the same test
+
+        Used to merge the results of an output and of its reruns (`robot --rerunfailed`) in one pass: the final
+        attempt of a test is kept, at the position of its first attempt.
+        :param records: List of records
+        :param positions: Dict test key -> index in `records`, updated
+        :param key: Key of the test (its long name)
+        :param record: Record to add
+    """
+    position = positions.get(key)
+    if position is None:
+        positions[key] = len(records)
+        records.append(record)
+    else:
+        records[position] = record
+
+
+def get_duration(test):
+    """ Return duration of a Robot Framework test in seconds. 0 if unknown. """
+    if not (test.starttime and test.endtime):
+        return 0
+    duration = round(test.elapsedtime / 1000)
+    return 1 if (duration < 1) else duration    # TestRail API doesn't manage msec (min value=1s)
+
+
+class ResultRecord(Mapping):
+    """ Base of test result records
+
+        Subclasses list in `KEYS` the keys of their dict view, and in `OPTIONAL_KEYS` the keys only present once
+        set (not `None`). Keys are read as attributes.
+    """
+    __slots__ = ('case_id', 'status_code', 'duration', 'message', 'rerun')
+    KEYS = ()
+    OPTIONAL_KEYS = ()
+
+    def __init__(self, case_id, status, duration=0, message=None):
+        """ Init
+        :param case_id: TestRail ID of the test case (int), `None` if unknown
+        :param status: Robot Framework status
+        :param duration: Duration in seconds
+        :param message: Robot Framework message of the test
+        """
+        self.case_id = case_id
+        self.status_code = ROBOT_STATUS_CODES[status]
+        self.duration = duration
+        self.message = message[:COMMENT_SIZE_LIMIT] if message else None
+        self.rerun = 0
+
+    @property
+    def id(self):    # pylint: disable=invalid-name
+        """ TestRail ID of the test case """
+        return self.case_id
+
+    @id.setter
+    def id(self, value):    # pylint: disable=invalid-name
+        self.case_id = value
+
+    @property
+    def status(self):
+        """ Robot Framework status """
+        return ROBOT_STATUSES[self.status_code]
+
+    @property
+    def comment(self):
+        """ TestRail comment """
+        return format_comment(self.message, self.rerun)
+
+    def __getitem__(self, key):
+        if key in self.KEYS or (key in self.OPTIONAL_KEYS and getattr(self, key) is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS and key not in self.OPTIONAL_KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        for key in self.KEYS:
+            yield key
+        for key in self.OPTIONAL_KEYS:
+            if getattr(self, key) is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, dict(self))
+
+    def as_dict(self):
+        """ Return the dict view of the record """
+        return dict(self)
+
+
+class CaseResult(ResultRecord):
+    """ Result of a test mapped to an existing TestRail test case """
+    __slots__ = ('name', 'version')
+    KEYS = ('id', 'status', 'name', 'comment', 'duration')
+    OPTIONAL_KEYS = ('version', )
+
+    def __init__(self, case_id, status, name, duration=0, message=None):
+        """ Init
+        :param name: Name of test (or of its suite) displayed when publishing
+        """
+        super().__init__(case_id, status, duration, message)
+        self.name = name
+        self.version = None
+
+
+class TemplateResult(ResultRecord):
+    """ Result of a test published with its TestRail test case template """
+    __slots__ = ('title', 'suite_name', 'section')
+    KEYS = ('title', 'suite_name', 'section', 'status', 'comment', 'duration')
+    OPTIONAL_KEYS = ('id', )
+
+    def __init__(self, title, suite_name, section, status, duration=0, message=None):
+        """ Init
+        :param title: Title of the test case
+        :param suite_name: Name of the Robot Framework suite, published as TestRail suite
+        :param section: Path of section (tuple of child suite names) in the TestRail suite
+        """
+        super().__init__(None, status, duration, message)
+        self.title = title
+        self.suite_name = suite_name
+        self.section = section
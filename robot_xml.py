@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Streaming reader of Robot Framework XML outputs
+
+    Suites are yielded as soon as their end is read, and the XML elements read are dropped after each keyword, test and
+    suite: memory doesn't depend on the size of the output. Both output formats are managed: Robot Framework 7 (`start`
+    and `elapsed` status attributes, `meta` and `tag` elements) and older (`starttime` and `endtime` status attributes,
+    `metadata/item` and `tags/tag` elements).
+    Metadata of a suite comes after its tests: with a `robot_model.TestFilter`, tests not selected are dropped at the
+    end of their suite, or at the end of the top level suite if the filter depends on parent suites.
+"""
+import datetime
+import xml.etree.ElementTree as ET
+
+from robot_model import LightSuite, LightTest, filter_tests
+
+_OLD_TIME_FORMAT = '%Y%m%d %H:%M:%S.%f'
+
+# Elements of keyword bodies, dropped as soon as read
+_BODY_TAGS = frozenset(('kw', 'for', 'while', 'if', 'try', 'group'))
+
+
+def read_xml_output(stream, test_filter=None):
+    """ Read the top level suite of a Robot Framework XML output
+    :param stream: Binary file-like object of the output
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests.
+    :return: `LightSuite`
+    """
+    suite = None
+    for suite in _iter_suites(stream, True, test_filter):
+        pass
+    if suite is None:
+        raise ValueError('Invalid Robot Framework XML output: no suite')
+    if test_filter is not None and test_filter.inherited:
+        filter_tests(suite, test_filter, recursive=True)
+    return suite
+
+
+def iter_xml_suites(stream, test_filter=None):
+    """ Yield the suites of a Robot Framework XML output as they are read, child suites before their parent
+
+        Suites yielded hold their tests, but not their child suites (already yielded).
+    :param stream: Binary file-like object of the output
+    :param test_filter: `robot_model.TestFilter` of the tests to keep. `None`: all tests. A filter depending on parent
+                        suites can't be evaluated before suites are yielded: it is ignored.
+    """
+    return _iter_suites(stream, False, test_filter)
+
+
+def _iter_suites(stream, attach, test_filter):
+    """ Yield the suites of an output, child suites before their parent
+    :param attach: If True, child suites are added to their parent
+    """
+    if test_filter is not None and test_filter.inherited:
+        test_filter = None    # Evaluated by caller, once the top level suite is read
+    suites = []
+    done = False    # Top level suite read: other `suite` elements are statistics
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'suite' and not done:
+                suite = LightSuite(suites[-1] if suites else None)
+                suite.name = elem.get('name', '')
+                if attach and suite.parent is not None:
+                    suite.parent.suites.append(suite)
+                suites.append(suite)
+        elif elem.tag in _BODY_TAGS:
+            elem.clear()
+        elif elem.tag == 'test' and suites:
+            suites[-1].tests.append(_read_test(elem, suites[-1]))
+            elem.clear()
+        elif elem.tag == 'suite' and suites:
+            suite = suites.pop()
+            done = not suites
+            suite.metadata = {item.get('name'): item.text or '' for item in _children(elem, 'meta', 'metadata/item')}
+            if test_filter is not None:
+                filter_tests(suite, test_filter)
+            elem.clear()
+            yield suite
+
+
+def _children(elem, *paths):
+    """ Return the sub-elements of `elem` matching one of `paths` """
+    return [child for path in paths for child in elem.findall(path)]
+
+
+def _read_test(elem, parent):
+    """ Return the test of a `test` element """
+    test = LightTest(parent)
+    test.name = elem.get('name', '')
+    test.tags = [tag.text or '' for tag in _children(elem, 'tag', 'tags/tag')]
+    status = elem.find('status')
+    if status is not None:
+        test.status = status.get('status', 'FAIL')
+        test.message = status.text or ''
+        if status.get('start'):
+            test.start_time = status.get('start')
+            test.elapsed_time = float(status.get('elapsed', 0))
+        else:
+            start, end = parse_time(status.get('starttime')), parse_time(status.get('endtime'))
+            if start and end:
+                test.start_time = start.isoformat()
+                test.elapsed_time = (end - start).total_seconds()
+    return test
+
+
+def parse_time(value):
+    """ Return the datetime of a time of Robot Framework < 7. `None` if unknown. """
+    if not value or value == 'N/A':
+        return None
+    return datetime.datetime.strptime(value, _OLD_TIME_FORMAT)
@@ -2,40 +2,69 @@
 # -*- coding: UTF-8 -*-
 """ Tool to publish Robot Framework results in TestRail """
 import argparse
+import collections
 import configparser
-import datetime
+import heapq
+import itertools
+import json
 import logging
 import os
 import re
 import sys
 import time
 
+import api_cache
+import logging_utils
+import rate_limit
+import result_cache
 import testrail
-from colorama import Fore, Style, init
-from robot.api import ExecutionResult, ResultVisitor
-from testrail_utils import TestRailApiUtils
+from robot_model import TestFilter
+from robot_results import CaseResult, ResultSet, add_record, get_duration, iter_output_suites, output_path
+from scheduler import DEFAULT_PREFETCH, Deadline, prefetch
+from testrail_utils import ROBOTFWK_TO_TESTRAIL_STATUS, TestRailApiUtils
 
-# pylint: disable=logging-format-interpolation
+# Robot Framework and colorama are imported where they are used, so that `--help` stays fast.
 
 PATH = os.getcwd()
 
-COMMENT_SIZE_LIMIT = 1000
+TESTCASE_LOG = logging_utils.get_testcase_logger()
 
-# Configure the logging
-LOG_FORMAT = '%(asctime)-15s %(levelname)-10s %(message)s'
-logging.basicConfig(filename=os.path.join(PATH, 'robotframework2testrail.log'), format=LOG_FORMAT, level=logging.DEBUG)
-CONSOLE_HANDLER = logging.StreamHandler()
-CONSOLE_HANDLER.setLevel(logging.INFO)
-CONSOLE_HANDLER.setFormatter(logging.Formatter('%(message)s'))
-logging.getLogger().addHandler(CONSOLE_HANDLER)
+# Maximum number of results published in one request
+DEFAULT_BATCH_SIZE = 100
 
+# Robot Framework statuses, by decreasing priority of publication: failures are visible in TestRail first
+DEFAULT_PRIORITIES = ('FAIL', 'SKIP', 'NOT RUN', 'PASS')
+# Number of results waiting in priority queue before the first batch is published
+DEFAULT_PRIORITY_WINDOW = 10000
 
-class TestRailResultVisitor(ResultVisitor):
-    """ Implement a `Visitor` that retrieves TestRail ID from Robot Framework Result """
+TEST_CASE_ID_TAG_REGEX = re.compile('test_case_id=C?[0-9]+')
+
+# Tests that may be published: other tests are dropped while outputs are read
+PUBLISHED_TESTS = TestFilter(suite_metadata=('TEST_CASE_ID', ), tag_regex=TEST_CASE_ID_TAG_REGEX)
+
+
+class TestRailResultVisitor(object):
+    """ Implement a `Visitor` that retrieves TestRail ID from Robot Framework Result
+
+        Only suites are visited (children first, as Robot Framework `ResultVisitor` does): keywords are never
+        walked, and Robot Framework is not needed to define the visitor.
+    """
 
     def __init__(self):
         """ Init """
         self.result_testcase_list = []
+        # Number of the rerun output visited (0: original output). `None` when outputs are not merged.
+        self.rerun = None
+        self.rerun_note = False
+        # Results replacing the results of the same tests (long name -> record), taken when the tests are visited
+        self.replacements = None
+        self._positions = {}
+
+    def visit_suite(self, suite):
+        """ Visit `suite` and its child suites """
+        for child_suite in suite.suites:
+            self.visit_suite(child_suite)
+        self.end_suite(suite)
 
     def end_suite(self, suite):
         """ Called when suite end """
@@ -44,7 +73,7 @@ class TestRailResultVisitor(ResultVisitor):
 
     @staticmethod
     def _get_test_case_id_from_suite(suite):
-        """ Retrieve list of Test Case ID from a suite
+        """ Retrieve list of Test Case ID (int) from a suite
             Manage both case: ID in metadata or in tags.
         """
         testcase_id = 0
@@ -52,133 +81,498 @@ class TestRailResultVisitor(ResultVisitor):
         # Retrieve test_case_id from metadata
         for metadata in suite.metadata:
             if metadata == 'TEST_CASE_ID':
-                testcase_id = suite.metadata['TEST_CASE_ID']
+                testcase_id = TestRailApiUtils.extract_testcase_id(suite.metadata['TEST_CASE_ID'])
+                if not testcase_id:
+                    logging.error('Testcase ID is bad formatted: "%s"', suite.metadata['TEST_CASE_ID'])
                 break    # We only take the first ID found
         # Retrieve test_case_id from tags
         for test in suite.tests:
             test_case_id_from_tags = TestRailResultVisitor._get_test_case_id_from_tags(test.tags)
             if test_case_id_from_tags:
                 result.append((test.name, test, test_case_id_from_tags))
-                logging.debug("Use TestRail ID from tag: ID = %s", test_case_id_from_tags)
+                TESTCASE_LOG.debug("Use TestRail ID from tag: ID = %s", test_case_id_from_tags)
             else:
                 if testcase_id:
                     result.append((suite.name, test, testcase_id))
-                    logging.debug("Use TestRail ID from metadata: ID = %s", testcase_id)
+                    TESTCASE_LOG.debug("Use TestRail ID from metadata: ID = %s", testcase_id)
         return result
 
     @staticmethod
     def _get_test_case_id_from_tags(tags):
-        """ Retrieve first Test Case ID found in tag list """
+        """ Retrieve first Test Case ID (int) found in tag list """
         for tag in tags:
-            if re.findall("(test_case_id=[C]?[0-9]+)", tag):
-                return tag[len('test_case_id='):]
+            if TEST_CASE_ID_TAG_REGEX.search(tag):
+                return TestRailApiUtils.extract_testcase_id(tag[len('test_case_id='):])
 
     def _append_testrail_result(self, name, test, testcase_id):
-        """ Append a result in TestRail format """
-        comment = None
-        if test.message:
-            comment = test.message
-            # Indent text to avoid string formatting by TestRail. Limit size of comment.
-            comment = "# Robot Framework result: #\n    " + comment[:COMMENT_SIZE_LIMIT].replace('\n', '\n    ')
-            comment += '\n...\nLog truncated' if len(str(comment)) > COMMENT_SIZE_LIMIT else ''
-        duration = 0
-        if test.starttime and test.endtime:
-            td_duration = datetime.datetime.strptime(test.endtime + '000', '%Y%m%d %H:%M:%S.%f')\
-                        - datetime.datetime.strptime(test.starttime + '000', '%Y%m%d %H:%M:%S.%f')
-            duration = round(td_duration.total_seconds())
-            duration = 1 if (duration < 1) else duration    # TestRail API doesn't manage msec (min value=1s)
-        self.result_testcase_list.append({
-            'id': testcase_id,
-            'status': test.status,
-            'name': name,
-            'comment': comment,
-            'duration': duration
-        })
-
-
-def get_testcases(xml_robotfwk_output):
-    """ Return the list of Testcase ID with status """
-    result = ExecutionResult(xml_robotfwk_output)
+        """ Append a result in TestRail format. A result of a rerun replaces the previous result of the test. """
+        record = CaseResult(testcase_id, test.status, name, duration=get_duration(test), message=test.message)
+        if self.replacements is not None:
+            record = self.replacements.pop(test.longname, record)
+        if self.rerun is None:
+            self.result_testcase_list.append(record)
+        else:
+            if self.rerun_note:
+                record.rerun = self.rerun
+            add_record(self.result_testcase_list, self._positions, test.longname, record)
+
+    def get_results_by_test(self):
+        """ Return the results of tests visited with `rerun` set: dict long name of test -> record """
+        return {longname: self.result_testcase_list[position] for longname, position in self._positions.items()}
+
+
+def get_testcases(xml_robotfwk_output, rerun_outputs=(), rerun_note=False, cache=None):
+    """ Return the list of Testcase ID with status
+
+        :param xml_robotfwk_output: Output of Robot Framework (XML or JSON), possibly compressed. '-' for stdin.
+        :param rerun_outputs: Outputs of reruns (`robot --rerunfailed`), in order. The last result of a test is kept.
+        :param rerun_note: If True, note in comment that a result comes from a rerun
+        :param cache: `result_cache.ResultCache` of the suites read, or `None`
+    """
+    return get_testcases_from_results(
+        ResultSet.read(xml_robotfwk_output, rerun_outputs, rerun_note, cache, test_filter=PUBLISHED_TESTS))
+
+
+def get_testcases_from_results(result_set):
+    """ Return the list of Testcase ID with status of a `ResultSet` """
+    return result_set.visit(TestRailResultVisitor()).result_testcase_list
+
+
+def iter_testcases(xml_robotfwk_output, rerun_outputs=(), rerun_note=False, cache=None):
+    """ Yield the lists of Testcase ID with status of the suites of an output, as the output is read
+
+        Records are the ones of `get_testcases`, in the same order, but the output is never held in memory. Outputs
+        of reruns (small) are read first: their results replace the results of the same tests as they are read, and
+        results of tests only in reruns come last.
+        :param xml_robotfwk_output: Output of Robot Framework (XML or JSON), possibly compressed. '-' for stdin.
+        :param rerun_outputs: Outputs of reruns (`robot --rerunfailed`), in order
+        :param rerun_note: If True, note in comment that a result comes from a rerun
+        :param cache: `result_cache.ResultCache` of the suites read, or `None`
+    """
     visitor = TestRailResultVisitor()
-    result.visit(visitor)
-    return visitor.result_testcase_list
+    if rerun_outputs:
+        rerun_visitor = TestRailResultVisitor()
+        rerun_visitor.rerun_note = rerun_note
+        for rerun, output in enumerate(rerun_outputs, 1):
+            rerun_visitor.rerun = rerun
+            for suite in iter_output_suites(output, cache, PUBLISHED_TESTS):
+                rerun_visitor.end_suite(suite)
+        visitor.replacements = rerun_visitor.get_results_by_test()
+
+    for suite in iter_output_suites(xml_robotfwk_output, cache, PUBLISHED_TESTS):
+        visitor.end_suite(suite)
+        if visitor.result_testcase_list:
+            yield visitor.result_testcase_list
+            visitor.result_testcase_list = []
+    if visitor.replacements:
+        yield list(visitor.replacements.values())
+
+
+class DeltaState(object):
+    """ Latest statuses of Test Runs, to only publish results whose status changed
+
+        Latest status of a test is the `status_id` returned by TestRail. Statuses published are also recorded, with
+        their date, in an optional JSON state file: a result older than `refresh_after` hours is published again even
+        if its status didn't change. Without date (no state file, or status changed in TestRail), the age of a result
+        is unknown and it is published again if `refresh_after` is set.
+    """
 
+    def __init__(self, path=None, refresh_after=None):
+        """ Init
+        :param path: Path of the JSON state file. `None` to only rely on TestRail statuses.
+        :param refresh_after: Age (hours) after which an unchanged result is published again. `None`: never.
+        """
+        self.path = path
+        self.refresh_after = refresh_after
+        self._runs = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='UTF-8') as state_file:
+                self._runs = json.load(state_file)
+
+    def is_unchanged(self, run_id, case_id, status_id, latest_status_id, now=None):
+        """ Return True if publishing `status_id` is redundant with the latest status of the test """
+        if status_id is None or status_id != latest_status_id:
+            return False
+        if self.refresh_after is None:
+            return True
+        published = self._runs.get(str(run_id), {}).get(str(case_id))
+        if not published or published[0] != status_id:
+            return False
+        now = time.time() if now is None else now
+        return now - published[1] < self.refresh_after * 3600
+
+    def record(self, run_id, case_id, status_id, now=None):
+        """ Record that `status_id` was published """
+        self._runs.setdefault(str(run_id), {})[str(case_id)] = [status_id, time.time() if now is None else now]
+
+    def save(self):
+        """ Save state file, if any """
+        if self.path:
+            with open(self.path, 'w', encoding='UTF-8') as state_file:
+                json.dump(self._runs, state_file)
 
-def publish_results(api, testcases, run_id=0, plan_id=0, version='', publish_blocked=True):
-    # pylint: disable=too-many-arguments, too-many-branches
-    """ Update testcases with provided Test Run or Test Plan
 
+class RunPublisher(object):
+    """ Publish results in a Test Run, batch after batch
+
+        Tests of the Test Run are fetched once. Each batch is filtered (tests missing in Test Run, "blocked" tests,
+        unchanged results) and published in one request. If TestRail rejects a batch, its results are published one
+        by one, so that only the faulty results are lost.
+        With a deadline, a batch is not started if the remaining time can't cover it (estimated from the previous
+        batches): its results stay pending. IDs of published, failed and pending results are kept for the report.
+    """
+
+    def __init__(self, api, run_id, version='', publish_blocked=True, print_testcases=True, delta=None, deadline=None):
+        # pylint: disable=too-many-arguments
+        """ Init
         :param api: Client to TestRail API
-        :param testcases: List of testcases with status, returned by `get_testcases`
         :param run_id: TestRail ID of Test Run to update
-        :param plan_id: TestRail ID of Test Plan to update
         :param version: Version to indicate in Test Case result
         :param publish_blocked: If False, results of "blocked" Test cases in TestRail are not published
-        :return: True if publishing was done. False in case of error.
-    """
-    if run_id:
-        if api.is_testrun_available(run_id):
-            count = 0
-            logging.info('Publish in Test Run #%d', run_id)
-            testcases_in_testrun_list = api.get_tests(run_id)
-
-            # Filter tests present in Test Run
-            case_id_in_testrun_list = [str(tc['case_id']) for tc in testcases_in_testrun_list]
-            testcases = [
-                testcase for testcase in testcases if testcase['id'].replace('C', '') in case_id_in_testrun_list
-            ]
-
-            # Filter "blocked" tests
-            if publish_blocked is False:
-                logging.info('Option "Don\'t publish blocked testcases" activated')
-                blocked_tests_list = [
-                    test.get('case_id') for test in testcases_in_testrun_list if test.get('status_id') == 2
-                ]
-                logging.info('Blocked testcases excluded: %s', ', '.join(str(elt) for elt in blocked_tests_list))
-                testcases = [
-                    testcase for testcase in testcases
-                    if api.extract_testcase_id(testcase.get('id')) not in blocked_tests_list
-                ]
+        :param print_testcases: If False, published testcases are not printed on console
+        :param delta: `DeltaState`. If set, results with the same status as in TestRail are not published.
+        :param deadline: `scheduler.Deadline` of publication, or `None`
+        """
+        self.api = api
+        self.run_id = run_id
+        self.version = version
+        self.print_testcases = print_testcases
+        self.delta = delta
+        self.deadline = deadline
+        self.count = 0
+        self.count_by_status = collections.Counter()
+        self.unchanged_count = 0
+        self.published = []
+        self.failed = []
+        self.pending = []
+        self.batch_time = 0.0
+        self.error = None
+
+        logging.info('Publish in Test Run #%d', run_id)
+        # Tests of the Test Run are indexed as they are decoded: the whole list is never held
+        self.case_id_in_testrun = set()
+        blocked_tests_list = []
+        self.latest_status = None if delta is None else {}
+        try:
+            for test in api.iter_tests(run_id, fields=('case_id', 'status_id')):
+                self.case_id_in_testrun.add(test['case_id'])
+                if test.get('status_id') == 2:
+                    blocked_tests_list.append(test['case_id'])
+                if self.latest_status is not None:
+                    self.latest_status[test['case_id']] = test.get('status_id')
+        except (testrail.APIError, OSError) as error:    # Network error, or request timed out at deadline
+            logging.error('Tests of Test Run #%d not read: %s. Its results are not published.', run_id, error)
+            self.error = str(error)
+            self.case_id_in_testrun = set()
+        self.blocked_tests = set()
+        if publish_blocked is False:
+            logging.info('Option "Don\'t publish blocked testcases" activated')
+            logging.info('Blocked testcases excluded: %s', ', '.join(str(elt) for elt in blocked_tests_list))
+            self.blocked_tests = set(blocked_tests_list)
+
+    def publish(self, testcases):
+        """ Publish a batch of testcases
+        :return: False if the batch was not started because of the deadline (its results are pending)
+        """
+        if self.error is not None:
+            self.skip(testcases)
+            return True
+        testcases = self._filter(testcases)
+        if not testcases:
+            return True
+        if self.deadline is not None and self.deadline.remaining() <= self.batch_time:
+            self.pending.extend(testcases)
+            return False
 
+        clock = time.monotonic if self.deadline is None else self.deadline.clock
+        start = clock()
+        for testcase in testcases:
+            if self.version:
+                testcase['version'] = self.version
+        try:
+            self.api.add_results(self.run_id, testcases)
+        except testrail.APIError as error:
+            logging.warning('Results not published at once in Test Run #%d (%s): publish them one by one', self.run_id,
+                            error)
+            for testcase in testcases:
+                self._publish_one(testcase)
+        except OSError as error:    # Network error, or request timed out at deadline
+            logging.error('Results not published in Test Run #%d: %s', self.run_id, error)
+            for testcase in testcases:
+                self.failed.append((testcase['id'], str(error)))
+        else:
+            for testcase in testcases:
+                self._published(testcase)
+        logging.info('Test Run #%d: %s', self.run_id, self.format_progress())
+        if self.api.rate_limiter is None:
+            time.sleep(0.25 if self.deadline is None else max(0.0, min(0.25, self.deadline.remaining())))
+        # Longest batch so far: a batch that can't be finished before the deadline isn't started
+        self.batch_time = max(self.batch_time, clock() - start)
+        return True
+
+    def skip(self, testcases):
+        """ Don't publish a batch of testcases: its results are pending, or failed if the Test Run couldn't be read """
+        if self.error is not None:
+            self.failed.extend((testcase['id'], self.error) for testcase in testcases)
+        else:
+            self.pending.extend(self._filter(testcases))
+
+    def _filter(self, testcases):
+        """ Return the testcases of a batch to publish """
+        # Filter tests present in Test Run, and "blocked" tests
+        testcases = [
+            testcase for testcase in testcases
+            if TestRailApiUtils.extract_testcase_id(testcase['id']) in self.case_id_in_testrun and
+            TestRailApiUtils.extract_testcase_id(testcase['id']) not in self.blocked_tests
+        ]
+
+        # Filter unchanged results
+        if self.delta is not None:
+            changed_testcases = []
             for testcase in testcases:
-                if version:
-                    testcase['version'] = version
-                try:
-                    api.add_result(run_id, testcase)
-                    count += 1
-                    pretty_print_testcase(testcase)
-                    logging.debug('{id}\t{status}\t{name}\t'.format(**testcase))
+                case_id = TestRailApiUtils.extract_testcase_id(testcase['id'])
+                status_id = ROBOTFWK_TO_TESTRAIL_STATUS.get(testcase['status'])
+                if not self.delta.is_unchanged(self.run_id, case_id, status_id, self.latest_status.get(case_id)):
+                    changed_testcases.append(testcase)
+            self.unchanged_count += len(testcases) - len(changed_testcases)
+            testcases = changed_testcases
+        return testcases
+
+    def format_progress(self):
+        """ Return the number of results published, by status """
+        return ', '.join('{} {}'.format(count, status) for status, count in sorted(self.count_by_status.items()))
+
+    def _publish_one(self, testcase):
+        """ Publish the result of a testcase alone """
+        try:
+            self.api.add_result(self.run_id, testcase)
+        except (testrail.APIError, OSError) as error:
+            if 'No (active) test found for the run/case combination' not in str(error):
+                self.failed.append((testcase['id'], str(error)))
+                if self.print_testcases:
+                    pretty_print_testcase(testcase, str(error))
                     print()
-                except testrail.APIError as error:
-                    if 'No (active) test found for the run/case combination' not in str(error):
-                        pretty_print_testcase(testcase, str(error))
-                        logging.debug('{id}\t{status}\t{name}\tnot published'.format(**testcase))
-                        print()
-                time.sleep(0.25)
-            logging.info('%d result(s) published in Test Run #%d.', count, run_id)
+                TESTCASE_LOG.debug('%s\t%s\t%s\tnot published: %s', testcase['id'], testcase['status'],
+                                   testcase['name'], error)
         else:
-            logging.error('Test Run #%d is is not available', run_id)
-            return False
+            self._published(testcase)
+
+    def _published(self, testcase):
+        """ Record a published result """
+        self.count += 1
+        self.count_by_status[testcase['status']] += 1
+        self.published.append(testcase['id'])
+        if self.delta is not None:
+            self.delta.record(self.run_id, TestRailApiUtils.extract_testcase_id(testcase['id']),
+                              ROBOTFWK_TO_TESTRAIL_STATUS.get(testcase['status']))
+        if self.print_testcases:
+            pretty_print_testcase(testcase)
+            print()
+        TESTCASE_LOG.debug('%s\t%s\t%s\t', testcase['id'], testcase['status'], testcase['name'])
+
+    def close(self):
+        """ End of publication: log the summary, save delta state """
+        if self.delta is not None:
+            logging.info('%d unchanged result(s) not published', self.unchanged_count)
+            self.delta.save()
+        logging.info('%d result(s) published in Test Run #%d.', self.count, self.run_id)
+        if self.count:
+            logging.info('    %s', self.format_progress())
+        if self.failed or self.pending:
+            logging.warning('Test Run #%d: %d result(s) failed, %d result(s) pending', self.run_id, len(self.failed),
+                            len(self.pending))
+
+
+class PublishReport(object):
+    """ Report of a publication: results published, failed and pending in each Test Run, saved as JSON """
+
+    def __init__(self, deadline=None):
+        """ Init
+        :param deadline: `scheduler.Deadline` of publication, or `None`
+        """
+        self.deadline = deadline
+        self.deadline_reached = False
+        self.complete = True
+        self.error = None
+        self.publishers = []
+
+    def as_dict(self):
+        """ Return the report as a dict """
+        report = {
+            'deadline_reached': self.deadline_reached,
+            # False if the output was not read up to its end: results not read are missing in report
+            'complete': self.complete,
+            'runs': {
+                str(publisher.run_id): {
+                    'published': [str(case_id) for case_id in publisher.published],
+                    'failed': [{'id': str(case_id), 'error': error} for case_id, error in publisher.failed],
+                    'pending': [str(testcase['id']) for testcase in publisher.pending],
+                } for publisher in self.publishers
+            },
+        }
+        if self.error is not None:    # Test Runs to publish in not found
+            report['error'] = self.error
+        if self.deadline is not None:
+            report['deadline'] = self.deadline.seconds
+            report['elapsed'] = round(self.deadline.elapsed(), 3)
+        return report
+
+    def save(self, path):
+        """ Save the report in a JSON file """
+        with open(path, 'w', encoding='UTF-8') as report_file:
+            json.dump(self.as_dict(), report_file, indent=2)
+
+
+def iter_priority_batches(testcases, batch_size, priorities=DEFAULT_PRIORITIES, window=DEFAULT_PRIORITY_WINDOW):
+    """ Yield lists of at most `batch_size` testcases, by priority of their status
+
+        Testcases wait in a priority queue of `window` testcases: each batch takes the testcases of highest priority
+        in queue, in order of arrival for the same priority. Statuses not in `priorities` come last.
+        Testcases of the same TestRail case wait together, in order of arrival, with the priority of their worst
+        status: the last result published for a case is the last one read.
+        :param testcases: Iterable of testcases with status
+        :param priorities: Robot Framework statuses, by decreasing priority
+        :param window: Number of testcases in queue before the first batch. `None` to read all testcases first.
+    """
+    rank = {status: index for index, status in enumerate(priorities)}
+    window = float('inf') if window is None else max(window, batch_size)
+    queue = []    # (rank, sequence, case ID) of each group. Entries of groups whose rank changed since are skipped.
+    groups = {}    # case ID -> [rank, sequence, testcases] of testcases waiting
+    waiting = 0
+
+    def pop_batch(size):
+        """ Return the next `size` testcases of highest priority """
+        batch = []
+        while len(batch) < size and queue:
+            group_rank, sequence, case_id = queue[0]
+            group = groups.get(case_id)
+            if group is None or group[:2] != [group_rank, sequence]:
+                heapq.heappop(queue)
+                continue
+            taken = group[2][:size - len(batch)]
+            del group[2][:len(taken)]
+            batch.extend(taken)
+            if not group[2]:
+                del groups[case_id]
+                heapq.heappop(queue)
+        return batch
+
+    for sequence, testcase in enumerate(testcases):
+        testcase_rank = rank.get(testcase['status'], len(rank))
+        case_id = TestRailApiUtils.extract_testcase_id(testcase['id'])
+        case_id = testcase['id'] if case_id is None else case_id
+        group = groups.get(case_id)
+        if group is None:
+            groups[case_id] = [testcase_rank, sequence, [testcase]]
+            heapq.heappush(queue, (testcase_rank, sequence, case_id))
+        else:
+            group[2].append(testcase)
+            if testcase_rank < group[0]:
+                group[0] = testcase_rank
+                heapq.heappush(queue, (testcase_rank, group[1], case_id))
+        waiting += 1
+        if waiting >= window:
+            batch = pop_batch(batch_size)
+            waiting -= len(batch)
+            yield batch
+    while waiting:
+        batch = pop_batch(min(batch_size, waiting))
+        waiting -= len(batch)
+        yield batch
+
+
+def publish_results(api,
+                    testcases,
+                    run_id=0,
+                    plan_id=0,
+                    version='',
+                    publish_blocked=True,
+                    print_testcases=True,
+                    delta=None,
+                    batch_size=DEFAULT_BATCH_SIZE,
+                    priorities=DEFAULT_PRIORITIES,
+                    priority_window=DEFAULT_PRIORITY_WINDOW,
+                    deadline=None,
+                    report=None):
+    # pylint: disable=too-many-arguments, too-many-locals
+    """ Update testcases with provided Test Run or Test Plan
 
-    elif plan_id:
-        if api.is_testplan_available(plan_id):
+        Testcases are published by batches as they come: with an iterator (see `iter_testcases`), the first results
+        are published while the next ones are read. Batches are filled by priority of status (see
+        `iter_priority_batches`): failures are published first.
+        :param api: Client to TestRail API
+        :param testcases: Iterable of testcases with status, e.g. list returned by `get_testcases`
+        :param run_id: TestRail ID of Test Run to update
+        :param plan_id: TestRail ID of Test Plan to update
+        :param version: Version to indicate in Test Case result
+        :param publish_blocked: If False, results of "blocked" Test cases in TestRail are not published
+        :param print_testcases: If False, published testcases are not printed on console
+        :param delta: `DeltaState`. If set, results with the same status as in TestRail are not published.
+        :param batch_size: Maximum number of results published in one request
+        :param priorities: Robot Framework statuses, by decreasing priority of publication
+        :param priority_window: Number of results in priority queue before the first batch. `None`: all results.
+        :param deadline: `scheduler.Deadline`. If set, batches that can't be published before it are not started.
+        :param report: `PublishReport` filled with the results published, failed and pending
+        :return: True if publishing was done. False in case of error (setup errors are in `report`), or if the
+                 deadline was reached.
+    """
+    report = PublishReport(deadline) if report is None else report
+    if deadline is not None:
+        api.deadline = deadline    # From the first request on
+    try:
+        if run_id:
+            if not api.is_testrun_available(run_id):
+                logging.error('Test Run #%d is is not available', run_id)
+                return False
+            run_ids = [run_id]
+
+        elif plan_id:
+            if not api.is_testplan_available(plan_id):
+                logging.error('Test Plan #%d is is not available', plan_id)
+                return False
             logging.info('Publish in Test Plan #%d', plan_id)
-            for _run_id in api.get_available_testruns(plan_id):
-                publish_results(api, testcases, run_id=_run_id, version=version, publish_blocked=publish_blocked)
+            run_ids = api.get_available_testruns(plan_id)
+
         else:
-            logging.error('Test Plan #%d is is not available', plan_id)
+            from colorama import Fore
+            logging.error("You have to indicate a Test Run or a Test Plan ID")
+            print(Fore.LIGHTRED_EX + 'ERROR')
             return False
-
-    else:
-        logging.error("You have to indicate a Test Run or a Test Plan ID")
-        print(Fore.LIGHTRED_EX + 'ERROR')
+    except (testrail.APIError, OSError) as error:    # Network error, or request timed out at deadline
+        logging.error('Test Runs to publish in not read: %s', error)
+        report.error = str(error)
         return False
 
-    return True
+    report.publishers = [
+        RunPublisher(api, _run_id, version, publish_blocked, print_testcases, delta, deadline) for _run_id in run_ids
+    ]
+    batches = iter_priority_batches(testcases, batch_size, priorities, priority_window)
+    try:
+        for batch in batches:
+            if report.deadline_reached:
+                for publisher in report.publishers:
+                    publisher.skip(batch)
+                # Results read up to the deadline are reported as pending
+                if deadline.expired:
+                    report.complete = False
+                    break
+                continue
+            for publisher in report.publishers:
+                if report.deadline_reached:
+                    publisher.skip(batch)
+                elif not publisher.publish(batch):
+                    logging.warning('Deadline: %.1fs left, not enough to publish a batch. Publication stopped.',
+                                    deadline.remaining())
+                    report.deadline_reached = True
+    finally:
+        for publisher in report.publishers:
+            publisher.close()
+    return not report.deadline_reached and all(publisher.error is None for publisher in report.publishers)
 
 
 def pretty_print(testcases):
     """ Pretty print a list of testcases """
+    from colorama import Fore
     for testcase in testcases:
         pretty_print_testcase(testcase)
         print(Fore.RESET)
@@ -186,6 +580,7 @@ def pretty_print(testcases):
 
 def pretty_print_testcase(testcase, error=''):
     """ Pretty print a testcase """
+    from colorama import Fore, Style
     if error:
         msg_template = Style.BRIGHT + '{id}' + Style.RESET_ALL + '\t' + \
                        Fore.MAGENTA + '{status}' + Fore.RESET + '\t' + \
@@ -206,9 +601,10 @@ def options():
     parser = argparse.ArgumentParser(prog='robotframework2testrail.py', description=__doc__)
     parser.add_argument(
         'xml_robotfwk_output',
-        nargs=1,
-        type=argparse.FileType('r', encoding='UTF-8'),
-        help='XML output results of Robot Framework')
+        nargs='+',
+        type=output_path,
+        help='XML output results of Robot Framework, followed by outputs of reruns (--rerunfailed) if any. '
+        'May be compressed (gzip, bzip2, xz, zstandard). "-" for stdin.')
     parser.add_argument(
         '--tr-config',
         dest='config',
@@ -220,6 +616,66 @@ def options():
         '--tr-password', dest='password', metavar='API_KEY', help='API key of TestRail account with write access.')
     parser.add_argument(
         '--tr-version', dest='version', metavar='VERSION', help='Indicate a version in Test Case result.')
+    parser.add_argument(
+        '--rerun-note', action='store_true', help='Note in comment of results coming from a rerun output.')
+    parser.add_argument(
+        '--tr-delta',
+        dest='delta',
+        action='store_true',
+        help='Only publish results whose status differs from the latest status in TestRail.')
+    parser.add_argument(
+        '--tr-delta-state',
+        dest='delta_state',
+        metavar='FILE',
+        help='JSON file recording results published in delta mode, with their date. Implies --tr-delta.')
+    parser.add_argument(
+        '--tr-delta-refresh',
+        dest='delta_refresh',
+        metavar='HOURS',
+        type=float,
+        help='In delta mode, publish again an unchanged result older than HOURS hours.')
+    parser.add_argument(
+        '--tr-batch-size',
+        dest='batch_size',
+        metavar='N',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help='Maximum number of results published in one request. Default: %(default)s.')
+    parser.add_argument(
+        '--tr-priority',
+        dest='priorities',
+        metavar='STATUSES',
+        type=lambda value: tuple(status.strip().upper() for status in value.split(',')),
+        default=DEFAULT_PRIORITIES,
+        help='Robot Framework statuses by decreasing priority of publication, separated by commas. '
+        'Default: ' + ','.join(DEFAULT_PRIORITIES) + '.')
+    parser.add_argument(
+        '--tr-priority-window',
+        dest='priority_window',
+        metavar='N',
+        type=int,
+        default=DEFAULT_PRIORITY_WINDOW,
+        help='Number of results read before publishing, to publish them by priority. Default: %(default)s.')
+    parser.add_argument(
+        '--read-ahead',
+        dest='read_ahead',
+        metavar='SUITES',
+        type=int,
+        default=DEFAULT_PREFETCH,
+        help='Maximum number of suites read ahead of publication. Default: %(default)s.')
+    parser.add_argument(
+        '--deadline',
+        dest='deadline',
+        metavar='SECONDS',
+        type=float,
+        help='Time budget of publication, from start. Batches that can\'t be published before the deadline are not '
+        'started: their results are reported as pending. Default: no deadline.')
+    parser.add_argument(
+        '--report',
+        dest='report',
+        metavar='FILE',
+        help='JSON file reporting the results published, failed and pending in each Test Run.')
+    rate_limit.add_rate_arguments(parser)
     parser.add_argument('--dryrun', action='store_true', help='Run script but don\'t publish results.')
     parser.add_argument(
         '--tr-dont-publish-blocked',
@@ -241,6 +697,9 @@ def options():
         type=int,
         default=None,
         help='Identifier of Test Plan, that appears in TestRail.')
+    api_cache.add_cache_arguments(parser)
+    result_cache.add_result_cache_arguments(parser)
+    logging_utils.add_logging_arguments(parser)
 
     opt = parser.parse_known_args()
     if opt[1]:
@@ -248,49 +707,91 @@ def options():
     return opt[0]
 
 
-if __name__ == '__main__':
-    # Global init
-    init()    # colorama
-
-    # Manage options
-    ARGUMENTS = options()
-
-    TESTCASES = get_testcases(ARGUMENTS.xml_robotfwk_output[0].name)
+def main():
+    """ Publish results of a Robot Framework output according to command line options """
+    # Manage options before anything else: `--help` stays fast
+    arguments = options()
+    deadline = Deadline(arguments.deadline) if arguments.deadline is not None else None
 
-    if ARGUMENTS.dryrun:
-        pretty_print(TESTCASES)
+    # Global init
+    from colorama import Fore, init
+    init()
+    logging_utils.configure_logging(
+        arguments.log_file or os.path.join(PATH, 'robotframework2testrail.log'),
+        max_bytes=arguments.log_max_bytes,
+        backup_count=arguments.log_backup_count,
+        sample_rate=arguments.log_sample,
+        summary_only=arguments.log_summary_only)
+
+    cache = result_cache.create_result_cache(arguments)
+    if arguments.dryrun:
+        pretty_print(
+            get_testcases(
+                arguments.xml_robotfwk_output[0],
+                rerun_outputs=arguments.xml_robotfwk_output[1:],
+                rerun_note=arguments.rerun_note,
+                cache=cache))
         print(Fore.GREEN + 'OK')
         sys.exit()
 
-    # Init global variables
-    CONFIG = configparser.ConfigParser()
-    CONFIG.read_file(ARGUMENTS.config)
-    URL = CONFIG.get('API', 'url')
-    EMAIL = CONFIG.get('API', 'email')
-    VERSION = ARGUMENTS.version
-    PUBLISH_BLOCKED = not ARGUMENTS.tr_dont_publish_blocked
-    if ARGUMENTS.password:
-        PASSWORD = ARGUMENTS.password
+    # Init variables
+    config = configparser.ConfigParser()
+    config.read_file(arguments.config)
+    url = config.get('API', 'url')
+    email = config.get('API', 'email')
+    version = arguments.version
+    publish_blocked = not arguments.tr_dont_publish_blocked
+    delta = None
+    if arguments.delta or arguments.delta_state or arguments.delta_refresh is not None:
+        delta = DeltaState(arguments.delta_state, arguments.delta_refresh)
+    if arguments.password:
+        password = arguments.password
     else:
-        PASSWORD = CONFIG.get('API', 'password')
+        password = config.get('API', 'password')
 
-    logging.debug('Connection info: URL=%s, EMAIL=%s, PASSWORD=%s', URL, EMAIL, len(PASSWORD) * '*')
+    logging.debug('Connection info: URL=%s, EMAIL=%s, PASSWORD=%s', url, email, len(password) * '*')
 
     # Init API
-    API = TestRailApiUtils(URL)
-    API.user = EMAIL
-    API.password = PASSWORD
-
-    # Main
-    if publish_results(
-            API,
-            TESTCASES,
-            run_id=ARGUMENTS.run_id,
-            plan_id=ARGUMENTS.plan_id,
-            version=VERSION,
-            publish_blocked=PUBLISH_BLOCKED):
+    api = TestRailApiUtils(url)
+    api.user = email
+    api.password = password
+    api.cache = api_cache.create_cache(arguments)
+    api.rate_limiter = rate_limit.create_rate_limiter(arguments, url)
+
+    # Main: output is read in a thread while results are published
+    batches = prefetch(
+        iter_testcases(
+            arguments.xml_robotfwk_output[0],
+            rerun_outputs=arguments.xml_robotfwk_output[1:],
+            rerun_note=arguments.rerun_note,
+            cache=cache), arguments.read_ahead)
+    report = PublishReport(deadline)
+    try:
+        published = publish_results(
+            api,
+            itertools.chain.from_iterable(batches),
+            run_id=arguments.run_id,
+            plan_id=arguments.plan_id,
+            version=version,
+            publish_blocked=publish_blocked,
+            print_testcases=not arguments.log_summary_only,
+            delta=delta,
+            batch_size=arguments.batch_size,
+            priorities=arguments.priorities,
+            priority_window=arguments.priority_window,
+            deadline=deadline,
+            report=report)
+    finally:
+        batches.close()
+        if arguments.report:
+            report.save(arguments.report)
+    if published:
         print(Fore.GREEN + 'OK' + Fore.RESET)
         sys.exit()
     else:
         print(Fore.LIGHTRED_EX + 'ERROR' + Fore.RESET)
         sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
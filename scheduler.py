@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Concurrent execution of a graph of dependent tasks, and of a producer ahead of its consumer, within a deadline
+
+    Tasks run on a thread pool as soon as the tasks they depend on succeeded. A failed task doesn't stop independent
+    tasks: only the tasks depending on it are skipped.
+    Logs of a task are buffered while it runs, then emitted in the order tasks were added to the graph, so that logs
+    are the same whatever the scheduling.
+"""
+import collections
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import logging_utils
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_PREFETCH = 16
+
+PENDING = 'pending'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+_TASK_CONTEXT = threading.local()
+
+
+class _TaskLogFilter(logging.Filter):
+    """ Divert records logged by a running task to its buffer """
+
+    def filter(self, record):
+        """ Return False if record is buffered """
+        records = getattr(_TASK_CONTEXT, 'records', None)
+        if records is None:
+            return True
+        records.append(record)
+        return False
+
+
+Task = collections.namedtuple('Task', ['name', 'func', 'args', 'depends_on'])
+
+
+class TaskGraph(object):
+    """ Graph of dependent tasks, run concurrently """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        """ Init
+        :param max_workers: Maximum number of tasks running at the same time
+        """
+        self.max_workers = max(1, max_workers)
+        self.tasks = collections.OrderedDict()
+        self.status = {}
+        self.results = {}
+        self.errors = {}
+
+    def add(self, name, func, *args, depends_on=()):
+        """ Add a task
+        :param name: Unique name of the task
+        :param func: Function called with `args` to run the task
+        :param depends_on: Names of the tasks that must succeed before this task runs. They must be already added.
+        :return: Name of the task
+        """
+        if name in self.tasks:
+            raise ValueError('Task "{}" already added'.format(name))
+        for dependency in depends_on:
+            if dependency not in self.tasks:
+                raise ValueError('Task "{}" depends on unknown task "{}"'.format(name, dependency))
+        self.tasks[name] = Task(name, func, args, tuple(depends_on))
+        self.status[name] = PENDING
+        return name
+
+    @property
+    def failed(self):
+        """ Names of failed tasks """
+        return [name for name in self.tasks if self.status[name] == FAILED]
+
+    @property
+    def skipped(self):
+        """ Names of tasks skipped because a task they depend on failed """
+        return [name for name in self.tasks if self.status[name] == SKIPPED]
+
+    def run(self):
+        """ Run all tasks
+        :return: True if all tasks succeeded
+        """
+        log_filter = _TaskLogFilter()
+        loggers = [logging.getLogger(), logging_utils.get_testcase_logger()]
+        for logger in loggers:
+            logger.addFilter(log_filter)
+        try:
+            self._run()
+        finally:
+            for logger in loggers:
+                logger.removeFilter(log_filter)
+        return all(status == SUCCEEDED for status in self.status.values())
+
+    def _run(self):
+        """ Run all tasks, then flush their logs in order """
+        logs = {}
+        flushed = iter(self.tasks)
+        next_to_flush = next(flushed, None)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            self._submit_ready(executor, running)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    logs[name], error = future.result()
+                    if error is None:
+                        self.status[name] = SUCCEEDED
+                    else:
+                        self.status[name] = FAILED
+                        self.errors[name] = error
+                self._skip_unreachable()
+                self._submit_ready(executor, running)
+                while next_to_flush is not None and self.status[next_to_flush] != PENDING:
+                    self._flush(next_to_flush, logs.pop(next_to_flush, []))
+                    next_to_flush = next(flushed, None)
+        # Tasks never started (depending on a failed task)
+        for name in self.tasks:
+            if self.status[name] == PENDING:
+                self.status[name] = SKIPPED
+        while next_to_flush is not None:
+            self._flush(next_to_flush, logs.pop(next_to_flush, []))
+            next_to_flush = next(flushed, None)
+
+    def _submit_ready(self, executor, running):
+        """ Submit pending tasks whose dependencies succeeded """
+        submitted = set(running.values())
+        for task in self.tasks.values():
+            if self.status[task.name] == PENDING and task.name not in submitted and all(
+                    self.status[dependency] == SUCCEEDED for dependency in task.depends_on):
+                running[executor.submit(self._execute, task)] = task.name
+
+    def _skip_unreachable(self):
+        """ Skip pending tasks depending on a failed or skipped task """
+        for task in self.tasks.values():
+            if self.status[task.name] == PENDING and any(
+                    self.status[dependency] in (FAILED, SKIPPED) for dependency in task.depends_on):
+                self.status[task.name] = SKIPPED
+
+    def _execute(self, task):
+        """ Run a task in a worker thread
+        :return: (log records of the task, exception raised or `None`)
+        """
+        _TASK_CONTEXT.records = []
+        error = None
+        try:
+            self.results[task.name] = task.func(*task.args)
+        except Exception as exception:    # pylint: disable=broad-except
+            error = exception
+        records, _TASK_CONTEXT.records = _TASK_CONTEXT.records, None
+        return records, error
+
+    def _flush(self, name, records):
+        """ Emit log records of a task """
+        for record in records:
+            logger = logging.getLogger() if record.name == 'root' else logging.getLogger(record.name)
+            logger.callHandlers(record)
+        if self.status[name] == FAILED:
+            logging.error('%s failed: %s', name, self.errors[name])
+        elif self.status[name] == SKIPPED:
+            logging.warning('%s skipped: a task it depends on failed', name)
+
+
+def prefetch(iterable, max_items=DEFAULT_PREFETCH):
+    """ Return an iterator on the items of `iterable`, produced in a thread from now on, while the previous ones are
+        consumed
+
+        At most `max_items` produced items wait for the consumer: the producer blocks beyond. An exception raised by the
+        producer is raised in the consumer. If the consumer stops early, the producer stops after its current item.
+    :param iterable: Iterable producing the items (e.g. a parser)
+    :param max_items: Size of the queue between producer and consumer
+    """
+    items = queue.Queue(max(1, max_items))
+    stopped = threading.Event()
+    end = object()
+
+    def produce():
+        """ Put the items of `iterable` in queue """
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    return
+                items.put((item, None))
+            items.put((end, None))
+        except Exception as error:    # pylint: disable=broad-except
+            items.put((end, error))
+
+    producer = threading.Thread(target=produce, name='prefetch', daemon=True)
+    producer.start()
+    return _consume(items, end, stopped, producer)
+
+
+def _consume(items, end, stopped, producer):
+    """ Yield the items put in queue by a `prefetch` producer """
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stopped.set()
+        # Unblock the producer, waiting for room in queue
+        while producer.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class Deadline(object):
+    """ Time budget, from its creation """
+
+    def __init__(self, seconds, clock=time.monotonic):
+        """ Init
+        :param seconds: Time budget (seconds)
+        :param clock: Function returning the current time (seconds)
+        """
+        self.seconds = seconds
+        self.clock = clock
+        self.start = clock()
+
+    def elapsed(self):
+        """ Return the seconds elapsed since creation """
+        return self.clock() - self.start
+
+    def remaining(self):
+        """ Return the seconds left before the deadline. Negative once it's passed. """
+        return self.seconds - self.elapsed()
+
+    @property
+    def expired(self):
+        """ True once the deadline is passed """
+        return self.remaining() <= 0
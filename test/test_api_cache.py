@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`api_cache` """
+import io
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+import testrail
+from api_cache import GetCache
+
+
+class Clock(object):
+    """ Manual clock """
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_per_endpoint():
+    """ Responses expire after the time to live of their endpoint """
+    clock = Clock()
+    cache = GetCache(default_ttl=60, ttls={'get_tests': 10, 'get_case': 0}, clock=clock)
+    load = Mock(side_effect=lambda: b'{}')
+    for uri in ('get_plan/1', 'get_tests/1', 'get_case/1'):
+        cache.get(uri, load)
+        cache.get(uri, load)
+    assert load.call_count == 4    # get_case is not cached
+    clock.now = 30
+    cache.get('get_plan/1', load)
+    cache.get('get_tests/1', load)
+    assert load.call_count == 5
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_lru_eviction():
+    """ Least recently used responses are evicted beyond the size limit """
+    cache = GetCache(max_bytes=10)
+    cache.get('get_run/1', lambda: b'1234')
+    cache.get('get_run/2', lambda: b'1234')
+    cache.get('get_run/1', Mock())
+    cache.get('get_run/3', lambda: b'1234')
+    cache.get('get_run/4', lambda: b'12345678901')    # Larger than cache
+    assert cache.size == 8
+    assert cache.get('get_run/1', lambda: b'new') == b'1234'
+    assert cache.get('get_run/2', lambda: b'new') == b'new'
+
+
+def test_invalidation():
+    """ A write drops the responses of the resources it changes """
+    cache = GetCache()
+    for uri in ('get_tests/1', 'get_tests/12', 'get_run/1', 'get_sections/1&suite_id=2', 'get_plan/3'):
+        cache.get(uri, lambda: b'old')
+    cache.invalidate('add_result_for_case/1/42')
+    assert [cache.get(uri, lambda: b'new') for uri in ('get_tests/1', 'get_tests/12', 'get_run/1', 'get_plan/3')] == [
+        b'new', b'old', b'new', b'new']
+    assert cache.get('get_sections/1&suite_id=2', lambda: b'new') == b'old'
+    cache.invalidate('unknown_write/1')
+    assert cache.size == 0
+
+
+def test_single_flight():
+    """ Concurrent requests of the same URI share one request, and a write during it prevents caching """
+    cache = GetCache()
+    started, release = threading.Event(), threading.Event()
+
+    def load():
+        started.set()
+        release.wait()
+        return b'{}'
+
+    load_mock = Mock(side_effect=load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('get_plan/1', load_mock))) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while cache.coalesced < 4:
+        time.sleep(0.001)
+    cache.invalidate('add_plan_entry/1')
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [b'{}'] * 5
+    assert load_mock.call_count == 1
+    assert cache.size == 0
+
+
+def test_single_flight_error():
+    """ An error of the request is raised, and nothing is cached """
+    cache = GetCache()
+    with pytest.raises(testrail.APIError):
+        cache.get('get_run/1', Mock(side_effect=testrail.APIError('Error')))
+    assert cache.get('get_run/1', lambda: b'{}') == b'{}'
+
+
+def test_client_cache():
+    """ GET responses are decoded from cache, POST requests invalidate them """
+    api = testrail.APIClient('https://example.testrail.net')
+    api.cache = GetCache()
+    api._APIClient__open = Mock(side_effect=lambda *args: io.BytesIO(b'{"is_completed": false}'))
+    run = api.send_get('get_run/1')
+    run['is_completed'] = True
+    assert api.send_get('get_run/1') == {'is_completed': False}
+    api.send_post('close_run/1', {})
+    api.send_get('get_run/1')
+    assert [call[0][:2] for call in api._APIClient__open.call_args_list] == [('GET', 'get_run/1'),
+                                                                              ('POST', 'close_run/1'),
+                                                                              ('GET', 'get_run/1')]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`json_stream` """
+import io
+import json
+
+import pytest
+
+from json_stream import JsonReader, iter_json_array
+
+ITEMS = [{'id': 1, 'title': 'Café ✓', 'refs': None}, {'id': 123456, 'title': 'B', 'refs': 'x'}, 7, 1.5e3]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 4096])
+def test_array(chunk_size):
+    """ Items of an array are decoded whatever the chunk boundaries """
+    stream = io.BytesIO(json.dumps(ITEMS, indent=1).encode('UTF-8'))
+    assert list(iter_json_array(stream, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 4096])
+def test_paginated_object(chunk_size):
+    """ Array of an object member is decoded, other members go in `meta` """
+    document = {'offset': 0, '_links': {'next': None}, 'cases': ITEMS[:2], 'size': 2}
+    meta = {}
+    stream = io.BytesIO(json.dumps(document).encode('UTF-8'))
+    items = iter_json_array(stream, key='cases', meta=meta, fields=('id', ), chunk_size=chunk_size)
+    assert list(items) == [{'id': 1}, {'id': 123456}]
+    assert meta == {'offset': 0, '_links': {'next': None}, 'size': 2}
+
+
+def test_empty_and_invalid():
+    """ Empty arrays and invalid documents """
+    assert list(iter_json_array(io.BytesIO(b' [ ] '))) == []
+    assert list(iter_json_array(io.BytesIO(b'{"tests": []}'), key='tests')) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b'{"error": "x"}'), key='tests'))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b'[1, 2')))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 4096])
+def test_reader_discard_value(chunk_size):
+    """ Discarded values are consumed whole, brackets and escapes in strings included """
+    document = {'discarded': [{'a': '] } \\" [ {'}, [], 'x\\'], 'kept': 1, 'empty': {}, 'last': 'y'}
+    reader = JsonReader(io.BytesIO(json.dumps(document).encode('UTF-8')), chunk_size)
+    decoded = {}
+    for member in reader.iter_members():
+        if member == 'discarded':
+            reader.discard_value()
+        else:
+            decoded[member] = reader.decode_value()
+    assert decoded == {'kept': 1, 'empty': {}, 'last': 'y'}
+    assert reader.peek() == ''
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`logging_utils` """
+import logging
+
+import pytest
+
+import logging_utils
+
+
+@pytest.fixture
+def root_logger():
+    """ Restore root and test case loggers after test """
+    logger = logging.getLogger()
+    handlers, level = list(logger.handlers), logger.level
+    yield logger
+    for handler in [elt for elt in logger.handlers if elt not in handlers]:
+        logger.removeHandler(handler)
+    logger.setLevel(level)
+    testcase_logger = logging_utils.get_testcase_logger()
+    for log_filter in list(testcase_logger.filters):
+        testcase_logger.removeFilter(log_filter)
+
+
+def make_record(name, level=logging.INFO):
+    """ Return a log record """
+    return logging.LogRecord(name, level, __file__, 0, 'message', None, None)
+
+
+def test_sampling_filter():
+    """ Test of class `SamplingFilter` """
+    log_filter = logging_utils.SamplingFilter(3)
+    assert [log_filter.filter(make_record('x')) for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert all(logging_utils.SamplingFilter(0).filter(make_record('x')) for _ in range(3))
+
+
+def test_summary_filter():
+    """ Test of class `SummaryFilter` """
+    log_filter = logging_utils.SummaryFilter()
+    assert log_filter.filter(make_record('root')) is True
+    assert log_filter.filter(make_record(logging_utils.TESTCASE_LOGGER_NAME)) is False
+    assert log_filter.filter(make_record(logging_utils.TESTCASE_LOGGER_NAME, logging.ERROR)) is True
+
+
+def test_configure_logging(tmpdir, root_logger, capsys):    # pylint: disable=redefined-outer-name
+    """ Test of function `configure_logging`: rotation, sampling and summary only console """
+    log_file = tmpdir.join('tool.log')
+    listener = logging_utils.configure_logging(
+        str(log_file), max_bytes=200, backup_count=2, sample_rate=2, summary_only=True)
+    testcase_logger = logging_utils.get_testcase_logger()
+    for index in range(10):
+        testcase_logger.info('testcase %d', index)
+    root_logger.info('summary')
+    listener.stop()
+
+    lines = ''.join(path.read() for path in sorted(tmpdir.listdir())).splitlines()
+    assert sum('testcase' in line for line in lines) <= 5
+    assert tmpdir.join('tool.log.1').check()
+    assert not tmpdir.join('tool.log.3').check()
+    assert capsys.readouterr().err == 'summary\n'
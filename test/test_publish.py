@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`publish` """
+import os
+from unittest.mock import Mock, patch
+
+import publish
+import robot_results
+import robotResult2Testrail
+import robotframework2testrail
+
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output.xml')
+
+
+def test_results_read_once():
+    """ Both publishers use the same result set: the output is parsed once """
+    with patch('robot_results.read_suite', wraps=robot_results.read_suite) as read_suite:
+        results = publish.read_results(OUTPUT)
+        testcases = robotframework2testrail.get_testcases_from_results(results)
+        testsuites, templates = robotResult2Testrail.get_result_data_from_results(results)
+    assert read_suite.call_count == 1
+    assert testcases == robotframework2testrail.get_testcases(OUTPUT)
+    assert (testsuites, templates) == robotResult2Testrail.get_result_data(OUTPUT)
+
+
+def test_publish_by_id():
+    """ Results of tests with an ID are published in a Test Run """
+    api = Mock()
+    api.is_testrun_available.return_value = True
+    api.iter_tests.return_value = [{'case_id': 345}, {'case_id': 366}]
+    assert publish.publish_by_id(api, publish.read_results(OUTPUT), run_id=10)
+    assert sorted(result['id'] for result in api.add_results.call_args[0][1]) == [345, 366]
+
+
+def test_connect():
+    """ Client is configured with rate limit and cache """
+    api = publish.connect('https://example.testrail.net', 'user', 'key', rate=5, rate_file='rate.json')
+    assert (api.user, api.password) == ('user', 'key')
+    assert (api.rate_limiter.rate, api.rate_limiter.path) == (5, 'rate.json')
+    assert api.cache is not None
+    api = publish.connect('https://example.testrail.net', 'user', 'key', cache_ttl=0)
+    assert api.rate_limiter is None and api.cache is None
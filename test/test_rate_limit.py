@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`rate_limit` """
+import multiprocessing
+import time
+
+import rate_limit
+
+
+def send_requests(path, count):
+    """ Send `count` requests limited by a host limiter of 50 requests per second (run in a process) """
+    limiter = rate_limit.HostRateLimiter(50, path)
+    for _ in range(count):
+        limiter.acquire()
+
+
+def test_host_rate_limiter(tmpdir):
+    """ Requests of all processes sharing the state file are spaced according to rate """
+    path = str(tmpdir.join('rate.json'))
+    processes = [multiprocessing.Process(target=send_requests, args=(path, 5)) for _ in range(3)]
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    assert time.monotonic() - start >= 14 / 50 - 0.01
+
+
+def test_host_rate_limiter_pause(tmpdir):
+    """ A pause delays the requests of all limiters sharing the state file """
+    path = str(tmpdir.join('rate.json'))
+    limiter = rate_limit.HostRateLimiter(100, path)
+    limiter.pause(0.2)
+    start = time.monotonic()
+    rate_limit.HostRateLimiter(100, path).acquire()
+    assert time.monotonic() - start >= 0.19
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`result_cache` """
+import os
+import shutil
+from unittest.mock import patch
+
+import result_cache
+import robotResult2Testrail
+import robotframework2testrail
+from result_cache import ResultCache
+
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output.xml')
+
+
+def test_read_suite(tmpdir):
+    """ An output is parsed once: results read from cache are the same """
+    cache = ResultCache(str(tmpdir.join('cache')), min_size=0)
+    expected = robotframework2testrail.get_testcases(OUTPUT)
+    with patch('result_cache.read_suite', wraps=result_cache.read_suite) as read_suite:
+        assert robotframework2testrail.get_testcases(OUTPUT, cache=cache) == expected
+        assert robotframework2testrail.get_testcases(OUTPUT, cache=cache) == expected
+        assert robotResult2Testrail.get_result_data(OUTPUT, cache=cache) == robotResult2Testrail.get_result_data(OUTPUT)
+    assert read_suite.call_count == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_iter_suites(tmpdir):
+    """ A cached output is streamed as it is read. An output not read up to its end is not cached. """
+    cache = ResultCache(str(tmpdir.join('cache')), min_size=0)
+    expected = list(robotframework2testrail.iter_testcases(OUTPUT))
+    suites = cache.iter_suites(OUTPUT)
+    next(suites)
+    suites.close()
+    assert list(robotframework2testrail.iter_testcases(OUTPUT, cache=cache)) == expected
+    with patch('result_cache.iter_suites') as iter_suites:
+        assert list(robotframework2testrail.iter_testcases(OUTPUT, cache=cache)) == expected
+        # Entries are shared by both ways of reading
+        assert robotframework2testrail.get_testcases(OUTPUT, cache=cache) == robotframework2testrail.get_testcases(
+            OUTPUT)
+    assert not iter_suites.called
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_keys_and_eviction(tmpdir):
+    """ Entries are keyed by content, small outputs are not cached, least recently used entries are evicted """
+    directory = str(tmpdir.join('cache'))
+    copies = []
+    for name in ('a.xml', 'b.xml'):
+        copies.append(str(tmpdir.join(name)))
+        shutil.copy(OUTPUT, copies[-1])
+    cache = ResultCache(directory, min_size=0)
+    for path in copies:
+        cache.read_suite(path)
+    assert (cache.hits, cache.misses) == (1, 1)    # Same content
+
+    with open(copies[1], 'a', encoding='UTF-8') as output:
+        output.write('\n')
+    cache.read_suite(copies[1])
+    entries = sorted(os.listdir(directory))
+    assert len(entries) == 3    # 2 entries and index
+    entry_size = os.path.getsize(os.path.join(directory, entries[0]))
+
+    cache = ResultCache(directory, max_bytes=2 * entry_size, min_size=0)
+    cache.read_suite(copies[0])
+    with open(copies[1], 'a', encoding='UTF-8') as output:
+        output.write('\n')
+    cache.read_suite(copies[1])
+    assert len(os.listdir(directory)) == 3
+    cache.read_suite(copies[0])
+    assert (cache.hits, cache.misses) == (2, 1)    # Entry of first content was used recently: kept
+
+    cache = ResultCache(directory, min_size=os.path.getsize(OUTPUT) + 1)
+    cache.read_suite(copies[0])
+    assert (cache.hits, cache.misses) == (0, 0)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of mod:`robotResult2Testrail` """
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from robot import result as robot_result
+
+import robotResult2Testrail
+
+
+def make_suite_tree():
+    """ Return a Robot result tree: an uploaded directory suite with nested suites """
+    root = robot_result.TestSuite(name='Root', metadata={'UPLOAD_TO_TESTRAIL': ''})
+    root.tests.create(name='TC_1 Root test', status='PASS')
+    child = root.suites.create(name='Child')
+    child.tests.create(name='TC_2 Child test', status='FAIL', message='Error')
+    grandchild = child.suites.create(name='Grandchild')
+    grandchild.tests.create(name='TC_3 Grandchild test', status='PASS')
+    other = root.suites.create(name='Other', metadata={'UPLOAD_TO_TESTRAIL': ''})
+    other.tests.create(name='TC_1 Other test', status='PASS')
+    return root
+
+
+def test_visitor_nested_suites():
+    """ Tests of nested suites are attached to the closest uploaded suite, with their section path """
+    visitor = robotResult2Testrail.TestRailResultVisitor()
+    visitor.visit_suite(make_suite_tree())
+    assert visitor.suite_list == [{'name': 'Other'}, {'name': 'Root'}]
+    assert [(test['suite_name'], test['section'], test['title']) for test in visitor.testcase_list] == [
+        ('Other', (), 'TC_1 Other test'),
+        ('Root', (), 'TC_1 Root test'),
+        ('Root', ('Child',), 'TC_2 Child test'),
+        ('Root', ('Child', 'Grandchild'), 'TC_3 Grandchild test'),
+    ]
+
+
+def test_get_result_data_json(tmpdir):
+    """ Suites and tests read from a JSON output are the ones read from the same XML output """
+    outputs = {}
+    for output_format in ('xml', 'json'):
+        outputs[output_format] = str(tmpdir.join('output.' + output_format))
+        robot_result.Result(suite=make_suite_tree()).save(outputs[output_format])
+    suites, testcases = robotResult2Testrail.get_result_data(outputs['json'])
+    expected_suites, expected_testcases = robotResult2Testrail.get_result_data(outputs['xml'])
+    assert suites == expected_suites
+    assert [test.as_dict() for test in testcases] == [test.as_dict() for test in expected_testcases]
+
+
+def test_update_robot_suites_sections():
+    """ Test cases are added in the section matching their Robot suite """
+    api = Mock()
+    api.get_suites.return_value = [{'id': 7, 'name': 'Root'}]
+    api.update_suite.return_value = {'id': 7}
+    api.get_sections.return_value = [{'id': 70, 'name': 'section', 'parent_id': None}]
+    api.add_section.side_effect = [{'id': 71}, {'id': 72}]
+    api.iter_cases.return_value = []
+    api.add_case.side_effect = [{'id': 1}, {'id': 2}, {'id': 3}]
+    testcases = [
+        {'title': 'TC_1 Root test', 'suite_name': 'Root', 'section': ()},
+        {'title': 'TC_2 Child test', 'suite_name': 'Root', 'section': ('Child',)},
+        {'title': 'TC_3 Grandchild test', 'suite_name': 'Root', 'section': ('Child', 'Grandchild')},
+    ]
+    assert robotResult2Testrail.update_robot_suites(api, [{'name': 'Root'}], testcases, 1) is True
+    api.get_sections.assert_called_once_with(1, 7)
+    assert [elt[0][1] for elt in api.add_section.call_args_list] == [
+        {'name': 'Child', 'suite_id': 7, 'parent_id': 70},
+        {'name': 'Grandchild', 'suite_id': 7, 'parent_id': 71},
+    ]
+    assert [elt[0][0] for elt in api.add_case.call_args_list] == [70, 71, 72]
+
+
+def test_index_suites_by_name():
+    """ The first of Testrail suites sharing a name is kept """
+    index = robotResult2Testrail.index_suites_by_name([{
+        'id': 1,
+        'name': 'A'
+    }, {
+        'id': 2,
+        'name': 'B'
+    }, {
+        'id': 3,
+        'name': 'A'
+    }])
+    assert {name: suite['id'] for name, suite in index.items()} == {'A': 1, 'B': 2}
+
+
+def test_update_robot_suites_matching():
+    """ Each Robot suite is matched on its own: a missing suite is added even after an existing one """
+    api = Mock()
+    api.get_suites.return_value = [{'id': 7, 'name': 'Existing', 'description': None}]
+    api.update_suite.return_value = {'id': 7}
+    api.add_suite.return_value = {'id': 8}
+    api.get_sections.return_value = [{'id': 70, 'name': 'section', 'parent_id': None}]
+    api.add_section.return_value = {'id': 80}
+    api.iter_cases.return_value = []
+    testsuites = [{'name': 'Existing'}, {'name': 'New'}]
+    assert robotResult2Testrail.update_robot_suites(api, testsuites, [], 1) is True
+    assert [elt[0][0] for elt in api.update_suite.call_args_list] == [7]
+    assert [elt[0][0] for elt in api.add_suite.call_args_list] == [1]
+    assert [(suite['id'], suite['section_id']) for suite in testsuites] == [(7, 70), (8, 80)]
+
+
+def test_update_robot_suites_same_name():
+    """ Robot suites sharing a name missing in Testrail add one Testrail suite, updated by the next ones """
+    api = Mock()
+    api.get_suites.return_value = []
+    api.add_suite.return_value = {'id': 8}
+    api.update_suite.return_value = {'id': 8}
+    api.add_section.return_value = {'id': 80}
+    api.get_sections.return_value = [{'id': 80, 'name': 'section', 'parent_id': None}]
+    api.iter_cases.side_effect = [[], [{'id': 100, 'title': 'TC_1 Test'}]]
+    api.add_case.return_value = {'id': 100}
+    api.update_case.return_value = {'id': 100}
+    testsuites = [{'name': 'Same'}, {'name': 'Same'}]
+    testcases = [{'title': 'TC_1 Test', 'suite_name': 'Same', 'section': ()}]
+    assert robotResult2Testrail.update_robot_suites(api, testsuites, testcases, 1, max_workers=2) is True
+    api.add_suite.assert_called_once_with(1, testsuites[0])
+    assert [elt[0][0] for elt in api.update_suite.call_args_list] == [8]
+    api.add_case.assert_called_once_with(80, {'title': 'TC_1 Test'})
+    assert testcases[0]['id'] == 100
+
+
+def test_create_testrail_testplan_partial_failure():
+    """ A failing suite doesn't prevent other suites from being published in the test plan """
+    api = Mock()
+    api.get_suites.return_value = []
+    api.add_suite.side_effect = lambda pid, suite: {'id': {'Ok': 1, 'Broken': 2}[suite['name']]}
+    api.add_section.return_value = {'id': 10}
+    api.iter_cases.return_value = []
+    api.add_case.side_effect = lambda section_id, data: {'id': 100} if data['title'] == 'TC_1 Ok' else {}
+    api.add_plan.return_value = {'id': 50}
+    api.add_plan_entry.return_value = {'runs': [{'id': 60}]}
+    testsuites = [{'name': 'Ok'}, {'name': 'Broken'}]
+    testcases = [
+        robotResult2Testrail.TemplateResult('TC_1 Ok', 'Ok', (), 'PASS'),
+        robotResult2Testrail.TemplateResult('TC_1 Broken', 'Broken', (), 'FAIL'),
+    ]
+    assert robotResult2Testrail.create_testrail_testplan(api, testsuites, testcases, 1, max_workers=2) is False
+    api.add_plan_entry.assert_called_once_with(50, {'suite_id': 1, 'include_all': False, 'case_ids': [100]})
+    api.add_results.assert_called_once_with(60, [testcases[0]])
+
+
+def test_create_testrail_testplan_all_failed():
+    """ No test plan is created when no test suite could be updated """
+    api = Mock()
+    api.get_suites.return_value = []
+    api.add_suite.side_effect = robotResult2Testrail.testrail.APIError('Error')
+    testsuites = [{'name': 'Broken'}, {'name': 'Other'}]
+    assert robotResult2Testrail.create_testrail_testplan(api, testsuites, [], 1, max_workers=2) is False
+    assert not api.add_plan.called
+
+    # An open plan too old to be reused is kept
+    api.iter_open_plans.return_value = [{'id': 2, 'name': 'Nightly 2', 'created_on': time.time() - 7200}]
+    assert robotResult2Testrail.create_testrail_testplan(
+        api, testsuites, [], 1, plan_name='Nightly *', rotate_after=1) is False
+    assert not api.close_plan.called
+    assert not api.add_plan.called
+
+
+def test_publish_suite_results_chunks():
+    """ Test run only includes the cases executed, results are published by chunks """
+    api = Mock()
+    api.add_plan_entry.return_value = {'runs': [{'id': 60}]}
+    api.add_results.side_effect = [None, robotResult2Testrail.testrail.APIError('Error')]
+    testcases = []
+    for case_id in (11, 12, 11, 13):
+        testcases.append(robotResult2Testrail.TemplateResult('TC_1', 'Suite', (), 'PASS'))
+        testcases[-1].id = case_id
+    plan = {'id': 50, 'name': 'Plan', 'entries': {}}
+    robotResult2Testrail.publish_suite_results(api, plan, {'id': 1, 'name': 'Suite'}, testcases, chunk_size=3)
+    api.add_plan_entry.assert_called_once_with(50, {'suite_id': 1, 'include_all': False, 'case_ids': [11, 12, 13]})
+    assert [args[0][1] for args in api.add_results.call_args_list] == [testcases[:3], testcases[3:]]
+    api.add_result_alt.assert_called_once_with(60, testcases[3])
+
+
+def test_open_testplan_by_name():
+    """ The latest open plan matching the name is reused, unless older than rotation age """
+    api = Mock()
+    now = time.time()
+    api.iter_open_plans.return_value = [
+        {'id': 1, 'name': 'Nightly 1', 'created_on': now - 7200},
+        {'id': 2, 'name': 'Nightly 2', 'created_on': now - 3600},
+        {'id': 3, 'name': 'Other', 'created_on': now},
+    ]
+    api.get_available_entries.return_value = [{'id': 'e1', 'suite_id': 7, 'runs': [{'id': 70}]}]
+    plan = {}
+    robotResult2Testrail.open_testplan(api, 1, plan, name='Nightly *', rotate_after=2)
+    assert (plan['id'], plan['entries']) == (2, {7: api.get_available_entries.return_value[0]})
+    assert not api.add_plan.called
+
+    api.add_plan.return_value = {'id': 4}
+    plan = {}
+    robotResult2Testrail.open_testplan(api, 1, plan, name='Nightly *', rotate_after=0.5)
+    api.close_plan.assert_called_once_with(2)
+    assert (plan['id'], plan['entries']) == (4, {})
+    assert plan['name'].startswith('Nightly 2')    # Date
+
+    api.is_testplan_available.return_value = False
+    with pytest.raises(robotResult2Testrail.testrail.APIError):
+        robotResult2Testrail.open_testplan(api, 1, {}, plan_id=9)
+
+
+def test_add_suite_run_existing_entry():
+    """ Test run of an existing entry is extended with the missing test cases only """
+    api = Mock()
+    api.iter_tests.return_value = [{'case_id': 11}, {'case_id': 12}]
+    plan = {'id': 50, 'entries': {1: {'id': 'e1', 'suite_id': 1, 'runs': [{'id': 60, 'include_all': False}]}}}
+    assert robotResult2Testrail.add_suite_run(api, plan, {'id': 1, 'name': 'Suite'}, [12, 13]) == 60
+    api.update_plan_entry.assert_called_once_with(50, 'e1', {'include_all': False, 'case_ids': [11, 12, 13]})
+    api.update_plan_entry.reset_mock()
+    assert robotResult2Testrail.add_suite_run(api, plan, {'id': 1, 'name': 'Suite'}, [11]) == 60
+    assert not api.update_plan_entry.called
+    assert not api.add_plan_entry.called
+
+
+def test_options_rotate_without_name(monkeypatch, capsys):
+    """ Rotation of a test plan only applies to a test plan found by name """
+    monkeypatch.setattr('sys.argv', ['robotResult2Testrail.py', '--tr-config', __file__, '--tr-plan-rotate', '24', 
+                                     __file__])
+    with pytest.raises(SystemExit):
+        robotResult2Testrail.options()
+    assert '--tr-plan-rotate requires --tr-plan-name' in capsys.readouterr().err
+
+
+def test_options_plan_name_wildcards(monkeypatch, capsys):
+    """ Only '*' may be used in the name pattern of a test plan: created test plans match it """
+    monkeypatch.setattr('sys.argv', ['robotResult2Testrail.py', '--tr-config', __file__, '--tr-plan-name', 
+                                     'Nightly [0-9]*', __file__])
+    with pytest.raises(SystemExit):
+        robotResult2Testrail.options()
+    assert 'only "*" may be used as wildcard' in capsys.readouterr().err
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`robot_results` """
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import re
+
+import pytest
+
+import robot_results
+from robot_model import TestFilter
+
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output.xml')
+
+
+def test_case_result_dict_view():
+    """ A `CaseResult` reads like the dict it replaces """
+    record = robot_results.CaseResult(344, 'FAIL', 'Name', duration=3, message='Error\nDetail')
+    assert record == {
+        'id': 344,
+        'status': 'FAIL',
+        'name': 'Name',
+        'comment': '# Robot Framework result: #\n    Error\n    Detail',
+        'duration': 3
+    }
+    assert '{id}\t{status}\t{name}'.format(**record) == '344\tFAIL\tName'
+    assert 'version' not in record
+    record['version'] = '1.2'
+    assert record.get('version') == '1.2'
+    assert record.status_code == robot_results.ROBOT_STATUS_CODES['FAIL']
+    with pytest.raises(KeyError):
+        record['unknown'] = 1
+    assert not hasattr(record, '__dict__')
+
+
+def test_template_result_dict_view():
+    """ TestRail ID of a `TemplateResult` is only in dict view once set """
+    record = robot_results.TemplateResult('TC_1 Test', 'Suite', ('Child', ), 'PASS')
+    assert 'id' not in record
+    assert record['comment'] is None
+    record['id'] = 12
+    assert record.as_dict() == {
+        'title': 'TC_1 Test',
+        'suite_name': 'Suite',
+        'section': ('Child', ),
+        'status': 'PASS',
+        'comment': None,
+        'duration': 0,
+        'id': 12
+    }
+
+
+def test_format_comment():
+    """ Test of function `format_comment` """
+    assert robot_results.format_comment('') is None
+    comment = robot_results.format_comment('x' * 2000)
+    assert comment.endswith('\n...\nLog truncated')
+    assert comment == robot_results.format_comment('x' * robot_results.COMMENT_SIZE_LIMIT)
+
+
+def test_add_record():
+    """ The last attempt of a test replaces the first one, at its position """
+    records, positions = [], {}
+    robot_results.add_record(records, positions, 'Suite.A', 'A1')
+    robot_results.add_record(records, positions, 'Suite.B', 'B1')
+    robot_results.add_record(records, positions, 'Suite.A', 'A2')
+    assert records == ['A2', 'B1']
+    assert robot_results.format_comment(None, rerun=2) == '# Robot Framework result: # (rerun #2)'
+
+
+@pytest.mark.parametrize('compress', [
+    lambda data: data,
+    gzip.compress,
+    bz2.compress,
+    lzma.compress,
+    lambda data: pytest.importorskip('zstandard').ZstdCompressor().compress(data),
+], ids=['plain', 'gzip', 'bzip2', 'xz', 'zstandard'])
+def test_open_output(compress, tmpdir):
+    """ Compressed outputs are decompressed on the fly """
+    data = b'<robot>' + b'x' * 100000 + b'</robot>'
+    path = tmpdir.join('output.xml.compressed')
+    path.write_binary(compress(data))
+    with robot_results.open_output(str(path)) as stream:
+        assert stream.read() == data
+
+
+def test_output_path(tmpdir):
+    """ Test of `argparse` type `output_path` """
+    assert robot_results.output_path('-') == '-'
+    with pytest.raises(argparse.ArgumentTypeError):
+        robot_results.output_path(str(tmpdir.join('missing.xml')))
+
+
+def test_read_suite_filter(tmpdir):
+    """ Tests not selected by a filter are dropped while reading, from XML and JSON outputs """
+    from robot.api import ExecutionResult
+    json_output = str(tmpdir.join('output.json'))
+    ExecutionResult(OUTPUT).save(json_output)
+    by_id = TestFilter(suite_metadata=('TEST_CASE_ID', ), tag_regex=re.compile('test_case_id='))
+    by_parent = TestFilter(suite_metadata=('TEST_CASE_ID', ), inherited=True)
+    nothing = TestFilter(suite_metadata=('UNKNOWN', ))
+    for path in (OUTPUT, json_output):
+        with robot_results.open_output(path) as stream:
+            suites = list(robot_results.iter_suites(stream, by_id))
+        assert [(suite.name, len(suite.tests)) for suite in suites] == [
+            ('Test Suite With Metadata', 2), ('Test Suite With Metadata And Tag', 2), ('Test Suite With Tag', 2),
+            ('Test Suite Without Id', 0), ('Examples', 0)]
+        with robot_results.open_output(path) as stream:
+            suite = robot_results.read_suite(stream, by_parent)
+        assert [len(child.tests) for child in suite.suites] == [2, 2, 0, 0]
+        with robot_results.open_output(path) as stream:
+            suite = robot_results.read_suite(stream, nothing)
+        assert [len(child.tests) for child in suite.suites] == [0, 0, 0, 0]
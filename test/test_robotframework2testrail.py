@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 """ Test of mod:`robotframework2testrail` """
+import json
 import os
+import time
 from unittest.mock import Mock, call
 
 import robotframework2testrail
+import testrail
+from scheduler import Deadline, prefetch
 from testrail_utils import TestRailApiUtils
 
 TESTRAIL_URL = 'https://example.testrail.net'
@@ -51,26 +55,58 @@ RESULTS = [{
 def test_get_testcases():
     """ Test of function `get_testcases` """
     results = robotframework2testrail.get_testcases(os.path.join(robotframework2testrail.PATH, 'test', 'output.xml'))
-    assert results == RESULTS
+    # Testcase IDs are parsed once in records
+    assert results == [dict(result, id=int(result['id'].replace('C', ''))) for result in RESULTS]
+    assert [result.as_dict() for result in results][1]['comment'] == RESULTS[1]['comment']
+
+
+def test_get_testcases_with_rerun(tmpdir):
+    """ Results of a rerun output replace the results of the original output """
+    from robot.api import ExecutionResult
+    output = os.path.join(robotframework2testrail.PATH, 'test', 'output.xml')
+    rerun = ExecutionResult(output)
+    rerun.suite.filter(included_tests=['Test2 With Id_344 From Metadata'])
+    for test in rerun.suite.all_tests:
+        test.status, test.message = 'PASS', ''
+    rerun_output = str(tmpdir.join('rerun.xml'))
+    rerun.save(rerun_output)
+
+    results = robotframework2testrail.get_testcases(output, rerun_outputs=[rerun_output], rerun_note=True)
+    assert len(results) == len(RESULTS)
+    assert results[1]['status'] == 'PASS'
+    assert results[1]['comment'] == '# Robot Framework result: # (rerun #1)'
+    assert results[4]['status'] == 'FAIL'
+    assert results[4]['comment'] == RESULTS[4]['comment']
+
+
+def test_get_testcases_json(tmpdir):
+    """ Records read from a JSON output are the records read from the same XML output """
+    from robot.api import ExecutionResult
+    output = os.path.join(robotframework2testrail.PATH, 'test', 'output.xml')
+    json_output = str(tmpdir.join('output.json'))
+    ExecutionResult(output).save(json_output)
+
+    expected = robotframework2testrail.get_testcases(output)
+    results = robotframework2testrail.get_testcases(json_output)
+    assert [result.as_dict() for result in results] == [result.as_dict() for result in expected]
 
 
 def test_publish_testrun():
     """ Test of function `publish_results` """
     api = Mock()
-    api.get_tests.return_value = [{'case_id': 344}, {'case_id': 345}]    # Other case_ids are missing
+    api.iter_tests.return_value = [{'case_id': 344}, {'case_id': 345}]    # Other case_ids are missing
     testrun_id = 100
     robotframework2testrail.publish_results(api, RESULTS, run_id=testrun_id, version='1.2.3.4')
     api.is_testrun_available.assert_called_with(testrun_id)
-    assert api.add_result.call_args_list[0] == call(testrun_id, RESULTS[0])
-    assert api.add_result.call_args_list[1] == call(testrun_id, RESULTS[1])
-    assert api.add_result.call_args_list[2] == call(testrun_id, RESULTS[2])
-    assert len(api.add_result.call_args_list) == 3    # Other case_ids are missing so not published
+    api.iter_tests.assert_called_once_with(testrun_id, fields=('case_id', 'status_id'))
+    # Other case_ids are missing so not published. Results of the same case keep their order.
+    assert api.add_results.call_args_list == [call(testrun_id, [RESULTS[0], RESULTS[1], RESULTS[2]])]
 
 
 def test_publish_testplan():
     """ Test of function `publish_results` """
     api = Mock()
-    api.get_tests.return_value = [{
+    api.iter_tests.return_value = [{
         'case_id': 9876
     }, {
         'case_id': 344
@@ -83,23 +119,144 @@ def test_publish_testplan():
     }]
     api.get_available_testruns.return_value = [101, 102]
     robotframework2testrail.publish_results(api, RESULTS, plan_id=100)
-    assert api.add_result.call_args_list[0] == call(101, RESULTS[0])
-    assert api.add_result.call_args_list[1] == call(101, RESULTS[1])
-    assert api.add_result.call_args_list[2] == call(101, RESULTS[2])
-    assert api.add_result.call_args_list[3] == call(101, RESULTS[3])
-    assert api.add_result.call_args_list[4] == call(101, RESULTS[5])
-    assert api.add_result.call_args_list[5] == call(102, RESULTS[0])
-    assert api.add_result.call_args_list[6] == call(102, RESULTS[1])
-    assert api.add_result.call_args_list[7] == call(102, RESULTS[2])
-    assert api.add_result.call_args_list[8] == call(102, RESULTS[3])
-    assert api.add_result.call_args_list[9] == call(102, RESULTS[5])
+    expected = [RESULTS[0], RESULTS[1], RESULTS[2], RESULTS[3], RESULTS[5]]
+    assert api.add_results.call_args_list == [call(101, expected), call(102, expected)]
+    api.is_testrun_available.assert_not_called()    # Test Runs of an open Test Plan are available
+
+
+def test_publish_batches():
+    """ Results are published by batches as they come. A rejected batch is published one by one. """
+    api = Mock()
+    api.iter_tests.return_value = [{'case_id': 344}, {'case_id': 345}, {'case_id': 366}]
+    api.add_results.side_effect = [None, testrail.APIError('Error')]
+    api.add_result.side_effect = [None, testrail.APIError('Error')]
+    testcases = iter(RESULTS)
+    assert robotframework2testrail.publish_results(api, testcases, run_id=100, batch_size=2, priorities=())
+    assert api.add_results.call_args_list == [call(100, RESULTS[0:2]), call(100, [RESULTS[2], RESULTS[3]])]
+    assert api.add_result.call_args_list == [call(100, RESULTS[2]), call(100, RESULTS[3])]
+
+
+def test_publish_deadline(tmpdir):
+    """ Batches that can't be published before the deadline are not started, and reported as pending """
+    clock = Mock(return_value=0)
+    api = Mock()
+    api.iter_tests.return_value = [{'case_id': 344}, {'case_id': 345}, {'case_id': 366}]
+    api.add_results.side_effect = lambda *args: setattr(clock, 'return_value', clock.return_value + 4)
+    report = robotframework2testrail.PublishReport(Deadline(10, clock=clock))
+    assert not robotframework2testrail.publish_results(
+        api, iter(RESULTS), run_id=100, batch_size=1, priorities=(), deadline=report.deadline, report=report)
+    assert api.add_results.call_count == 2    # 2 batches of 4s: no time left for the third one
+    report.save(str(tmpdir.join('report.json')))
+    with open(str(tmpdir.join('report.json')), encoding='UTF-8') as report_file:
+        assert json.load(report_file) == {
+            'deadline': 10,
+            'elapsed': 8,
+            'deadline_reached': True,
+            'complete': True,
+            'runs': {
+                '100': {
+                    'published': ['C344', 'C344'],
+                    'failed': [],
+                    'pending': ['C345', 'C366']
+                }
+            }
+        }
+
+    api.add_results.side_effect = OSError('timed out')
+    report = robotframework2testrail.PublishReport()
+    assert robotframework2testrail.publish_results(api, iter(RESULTS), run_id=100, priorities=(), report=report)
+    assert report.as_dict()['runs']['100']['failed'][0] == {'id': 'C344', 'error': 'timed out'}
+    assert not api.add_result.called
+
+
+def test_publish_deadline_timeout():
+    """ A request timed out at deadline ends publication with a partial report """
+    clock = Mock(return_value=0)
+    api = Mock()
+    api.rate_limiter = None
+    api.iter_tests.return_value = [{'case_id': 344}, {'case_id': 345}, {'case_id': 366}]
+
+    def time_out(*_):
+        clock.return_value = 10.05
+        raise OSError('timed out')
+
+    api.add_results.side_effect = time_out
+    report = robotframework2testrail.PublishReport(Deadline(10, clock=clock))
+    assert not robotframework2testrail.publish_results(
+        api, iter(RESULTS), run_id=100, batch_size=2, priorities=(), deadline=report.deadline, report=report)
+    assert api.add_results.call_count == 1
+    runs = report.as_dict()['runs']['100']
+    assert runs['failed'] == [{'id': 'C344', 'error': 'timed out'}] * 2
+    assert runs['pending'] == ['C345', 'C366']
+
+
+
+def test_publish_setup_error():
+    """ Setup requests are bounded by the deadline, their failures are reported """
+    api = Mock()
+    deadline = Deadline(10)
+    api.is_testrun_available.side_effect = lambda run_id: api.deadline is deadline
+    api.iter_tests.side_effect = OSError('timed out')
+    report = robotframework2testrail.PublishReport(deadline)
+    assert not robotframework2testrail.publish_results(
+        api, iter(RESULTS), run_id=100, priorities=(), deadline=deadline, report=report)
+    assert not api.add_results.called
+    failed = report.as_dict()['runs']['100']['failed']
+    assert failed == [{'id': result['id'], 'error': 'timed out'} for result in RESULTS]
+
+    api.get_available_testruns.side_effect = OSError('timed out')
+    report = robotframework2testrail.PublishReport()
+    assert not robotframework2testrail.publish_results(api, iter(RESULTS), plan_id=200, report=report)
+    assert report.as_dict()['error'] == 'timed out'
+    assert report.as_dict()['runs'] == {}
+
+
+def test_iter_priority_batches():
+    """ Batches are filled by priority of status, within the window of results waiting """
+    statuses = ['PASS', 'PASS', 'FAIL', 'SKIP', 'PASS', 'FAIL', 'UNKNOWN']
+    testcases = [{'id': index, 'status': status} for index, status in enumerate(statuses)]
+    batches = robotframework2testrail.iter_priority_batches(testcases, 2, priorities=('FAIL', 'SKIP', 'PASS'))
+    assert [[testcase['id'] for testcase in batch] for batch in batches] == [[2, 5], [3, 0], [1, 4], [6]]
+    batches = robotframework2testrail.iter_priority_batches(testcases, 2, window=3)
+    assert [[testcase['id'] for testcase in batch] for batch in batches] == [[2, 0], [3, 1], [5, 4], [6]]
+
+
+def test_iter_priority_batches_same_case():
+    """ Results of the same case keep their order: the last status published for a case is the last one read """
+    statuses = [('C1', 'FAIL'), ('C2', 'PASS'), ('C1', 'PASS'), ('C3', 'FAIL'), ('C2', 'FAIL'), ('C1', 'SKIP')]
+    testcases = [{'id': case_id, 'status': status, 'index': index} for index, (case_id, status) in enumerate(statuses)]
+    for window in (None, 2):
+        batches = list(robotframework2testrail.iter_priority_batches(testcases, 2, window=window))
+        published = [testcase for batch in batches for testcase in batch]
+        assert sorted(testcase['index'] for testcase in published) == list(range(len(testcases)))
+        for case_id in ('C1', 'C2', 'C3'):
+            indexes = [testcase['index'] for testcase in published if testcase['id'] == case_id]
+            assert indexes == sorted(indexes)
+    batches = robotframework2testrail.iter_priority_batches(testcases, 2, window=None)
+    # C2 has the priority of its failure, after C1 (read first)
+    assert [[testcase['index'] for testcase in batch] for batch in batches] == [[0, 2], [5, 1], [4, 3]]
+
+
+def test_iter_testcases_pipeline(tmpdir):
+    """ Records read as a stream in a producer thread are the records of `get_testcases` """
+    from robot.api import ExecutionResult
+    output = os.path.join(robotframework2testrail.PATH, 'test', 'output.xml')
+    rerun = ExecutionResult(output)
+    rerun.suite.filter(included_tests=['Test2 With Id_344 From Metadata'])
+    rerun_output = str(tmpdir.join('rerun.json'))
+    rerun.save(rerun_output)
+
+    batches = list(prefetch(robotframework2testrail.iter_testcases(output, [rerun_output], rerun_note=True), 1))
+    assert [len(batch) for batch in batches] == [2, 2, 2]    # One batch per suite
+    expected = robotframework2testrail.get_testcases(output, [rerun_output], rerun_note=True)
+    assert [result.as_dict() for batch in batches for result in batch] == [result.as_dict() for result in expected]
 
 
 def test_dont_publish_blocked():
     """ Test when blocked testcases are not published """
     api = Mock()
     testrun_id = 100
-    api.get_tests.return_value = [{
+    api.iter_tests.return_value = [{
         'case_id': 344,
         'status_id': 1
     }, {
@@ -111,7 +268,32 @@ def test_dont_publish_blocked():
     }]
     api.extract_testcase_id = TestRailApiUtils.extract_testcase_id    # don't mock this method
     robotframework2testrail.publish_results(api, RESULTS, run_id=100, publish_blocked=False)
-    assert len(api.add_result.call_args_list) == 3
-    assert api.add_result.call_args_list[0] == call(testrun_id, RESULTS[0])
-    assert api.add_result.call_args_list[1] == call(testrun_id, RESULTS[1])
-    assert api.add_result.call_args_list[2] == call(testrun_id, RESULTS[5])
+    assert api.add_results.call_args_list == [call(testrun_id, [RESULTS[0], RESULTS[1], RESULTS[5]])]
+
+
+def test_publish_delta(tmpdir):
+    """ Only results whose status changed are published in delta mode """
+    api = Mock()
+    testrun_id = 100
+    api.iter_tests.return_value = [{
+        'case_id': 344,
+        'status_id': 1
+    }, {
+        'case_id': 345,
+        'status_id': 1
+    }, {
+        'case_id': 348,
+        'status_id': 5
+    }]
+    state_file = str(tmpdir.join('state.json'))
+    delta = robotframework2testrail.DeltaState(state_file)
+    robotframework2testrail.publish_results(api, RESULTS, run_id=testrun_id, delta=delta)
+    # RESULTS[0] (C344 PASS) and RESULTS[2] (C345 PASS) are unchanged
+    assert api.add_results.call_args_list == [call(testrun_id, [RESULTS[1], RESULTS[5]])]
+
+    # Refresh unchanged results older than 1 hour: age is known from state file for published results only
+    delta = robotframework2testrail.DeltaState(state_file, refresh_after=1)
+    assert delta.is_unchanged(testrun_id, 348, 1, 1) is True
+    assert delta.is_unchanged(testrun_id, 348, 1, 1, now=time.time() + 3601) is False
+    assert delta.is_unchanged(testrun_id, 344, 1, 1) is False
+    assert delta.is_unchanged(testrun_id, 344, 5, 1) is False
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Test of module mod:`scheduler` """
+import logging
+import threading
+import time
+
+import pytest
+
+import scheduler
+
+
+def test_dependencies_and_failures():
+    """ Tasks run after their dependencies; tasks depending on a failed task are skipped """
+    calls = []
+
+    def task(name, fail=False):
+        """ Record call, fail if asked """
+        calls.append(name)
+        if fail:
+            raise RuntimeError(name + ' error')
+        return name.upper()
+
+    graph = scheduler.TaskGraph(max_workers=2)
+    graph.add('a', task, 'a')
+    graph.add('b', task, 'b', True)
+    graph.add('c', task, 'c', depends_on=['a'])
+    graph.add('d', task, 'd', depends_on=['b'])
+    graph.add('e', task, 'e', depends_on=['d', 'c'])
+    assert graph.run() is False
+    assert calls.index('c') > calls.index('a')
+    assert sorted(calls) == ['a', 'b', 'c']
+    assert graph.results == {'a': 'A', 'c': 'C'}
+    assert graph.failed == ['b']
+    assert graph.skipped == ['d', 'e']
+    assert str(graph.errors['b']) == 'b error'
+
+    with pytest.raises(ValueError):
+        graph.add('f', task, 'f', depends_on=['unknown'])
+
+
+def test_concurrency_and_log_order(caplog):
+    """ Independent tasks run concurrently; their logs are emitted in order of tasks """
+    barrier = threading.Barrier(3, timeout=5)
+
+    def task(name, delay):
+        """ Wait for other tasks, then log """
+        barrier.wait()
+        time.sleep(delay)
+        logging.info('%s start', name)
+        logging.info('%s end', name)
+
+    graph = scheduler.TaskGraph(max_workers=3)
+    for name, delay in [('first', 0.2), ('second', 0.1), ('third', 0)]:
+        graph.add(name, task, name, delay)
+    with caplog.at_level(logging.INFO):
+        assert graph.run() is True
+    assert [record.getMessage() for record in caplog.records] == [
+        'first start', 'first end', 'second start', 'second end', 'third start', 'third end'
+    ]
+
+
+def test_prefetch():
+    """ Items are produced ahead in a bounded queue; errors reach the consumer; an early stop ends the producer """
+    produced = []
+
+    def produce(count, error=None):
+        """ Produce `count` items, then raise `error` """
+        for item in range(count):
+            produced.append(item)
+            yield item
+        if error:
+            raise error
+
+    items = scheduler.prefetch(produce(10), max_items=2)
+    time.sleep(0.1)
+    assert len(produced) <= 3    # 2 in queue, 1 waiting for room
+    assert list(items) == list(range(10))
+
+    with pytest.raises(ValueError):
+        list(scheduler.prefetch(produce(3, ValueError('Parse error'))))
+
+    del produced[:]
+    items = scheduler.prefetch(produce(1000), max_items=1)
+    assert next(items) == 0
+    items.close()
+    assert len(produced) < 1000
+
+
+def test_deadline():
+    """ Remaining time decreases with the clock, down to expiration """
+    clock = [5]
+    deadline = scheduler.Deadline(10, clock=lambda: clock[0])
+    clock[0] = 12
+    assert (deadline.elapsed(), deadline.remaining(), deadline.expired) == (7, 3, False)
+    clock[0] = 15
+    assert deadline.expired
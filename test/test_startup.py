@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+""" Command line tools run as subprocesses: startup time budget, input from stdin """
+import gzip
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_XML = os.path.join(ROOT, 'test', 'output.xml')
+
+# Generous budgets (seconds), CI agents are slow: they catch a heavy import added at module level, not jitter.
+HELP_BUDGET = 1.5
+SMALL_PUBLISH_BUDGET = 4.0
+
+
+def run_timed(*args, cwd=ROOT):
+    """ Run a python command and return (elapsed time, completed process) """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable] + list(args), cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return time.perf_counter() - start, process
+
+
+@pytest.mark.parametrize('module', ['robotframework2testrail', 'robotResult2Testrail'])
+def test_import_is_light(module, tmpdir):
+    """ Importing a tool neither loads Robot Framework nor creates a log file """
+    code = 'import sys; sys.path.insert(0, {!r}); import {}; print("robot" in sys.modules, "colorama" in sys.modules)'
+    _, process = run_timed('-c', code.format(ROOT, module), cwd=str(tmpdir))
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.split() == [b'False', b'False']
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize('script', ['robotframework2testrail.py', 'robotResult2Testrail.py'])
+def test_help_budget(script):
+    """ `--help` answers within budget """
+    elapsed, process = run_timed(script, '--help')
+    assert process.returncode == 0, process.stderr
+    assert elapsed < HELP_BUDGET
+
+
+def test_small_publish_budget(tmpdir):
+    """ A dry run publish of a small output answers within budget """
+    config = tmpdir.join('testrail.cfg')
+    config.write('[API]\nurl = https://example.testrail.net\nemail = user@example.com\npassword = secret\n')
+    elapsed, process = run_timed(
+        os.path.join(ROOT, 'robotframework2testrail.py'), '--tr-config', str(config), '--tr-run-id', '1', '--dryrun',
+        OUTPUT_XML, cwd=str(tmpdir))
+    assert process.returncode == 0, process.stderr
+    assert elapsed < SMALL_PUBLISH_BUDGET
+
+
+def test_compressed_stdin(tmpdir):
+    """ A gzip compressed output can be piped to stdin """
+    config = tmpdir.join('testrail.cfg')
+    config.write('[API]\nurl = https://example.testrail.net\nemail = user@example.com\npassword = secret\n')
+    with open(OUTPUT_XML, 'rb') as output:
+        data = gzip.compress(output.read())
+    process = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'robotframework2testrail.py'), '--tr-config', str(config), '--tr-run-id',
+         '1', '--dryrun', '-'],
+        cwd=str(tmpdir), input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert process.returncode == 0, process.stderr
+    assert b'Test With Id 348 From Tag' in process.stdout
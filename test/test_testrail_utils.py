@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 """ Test of module mod:`testrail_utils` """
+import io
 from unittest.mock import Mock
 
 import pytest
@@ -83,6 +84,14 @@ def test_add_result(api):    # pylint: disable=redefined-outer-name
          'elapsed': '60s'})
 
 
+def test_add_results_skipped(api):    # pylint: disable=redefined-outer-name
+    """ Skipped and not run tests are published as blocked """
+    api.add_results(1, [{'id': 'C1', 'status': 'SKIP'}, {'id': 'C2', 'status': 'NOT RUN'}])
+    api.send_post.assert_called_once_with(
+        tr.API_ADD_RESULTS_CASES_URL.format(run_id=1),
+        {'results': [{'status_id': 2, 'case_id': 1}, {'status_id': 2, 'case_id': 2}]})
+
+
 def test_is_testrun_available(api):    # pylint: disable=redefined-outer-name
     """ Test of method `is_testrun_available` """
     api.send_get.return_value = {'is_completed': False}
@@ -119,6 +128,7 @@ def test_extract_testcase_id(api):    # pylint: disable=redefined-outer-name
     assert api.extract_testcase_id('c1234') == 1234
     assert api.extract_testcase_id('C1234 C9874') == 1234
     assert api.extract_testcase_id('1234') == 1234
+    assert api.extract_testcase_id(1234) == 1234
 
     # Error cases
     assert api.extract_testcase_id('') is None
@@ -132,3 +142,76 @@ def test_get_tests(api):    # pylint: disable=redefined-outer-name
     api.get_tests(testrun_id=run_id)
     print(api.send_get.call_args_list)
     api.send_get.assert_called_once_with(tr.API_GET_TESTS_URL.format(run_id=run_id))
+
+
+def test_section_index():
+    """ Test of class `SectionIndex` """
+    api = Mock()
+    api.get_sections.return_value = [{
+        'id': 1,
+        'name': 'section',
+        'parent_id': None
+    }, {
+        'id': 2,
+        'name': 'A',
+        'parent_id': 1
+    }, {
+        'id': 3,
+        'name': 'B',
+        'parent_id': 2
+    }, {
+        'id': 4,
+        'name': 'Other root',
+        'parent_id': None
+    }]
+    api.add_section.side_effect = [{'id': 10}, {'id': 11}, {'id': 12}]
+    index = tr.SectionIndex.load(api, 5, 6)
+    assert index.as_dict() == {(): 1, ('A',): 2, ('A', 'B'): 3}
+
+    assert index.ensure([('A', 'B'), ('A', 'C', 'D'), ('E',)]) == 3
+    assert [elt[0] for elt in api.add_section.call_args_list] == [
+        (5, {'name': 'E', 'suite_id': 6, 'parent_id': 1}),
+        (5, {'name': 'C', 'suite_id': 6, 'parent_id': 2}),
+        (5, {'name': 'D', 'suite_id': 6, 'parent_id': 11}),
+    ]
+    assert index[('A', 'C', 'D')] == 12
+    api.get_sections.assert_called_once_with(5, 6)
+
+
+def test_section_index_duplicate_names():
+    """ Of siblings with the same name, the first one and its subtree only are indexed """
+    api = Mock()
+    api.get_sections.return_value = [
+        {'id': 1, 'name': 'section', 'parent_id': None},
+        {'id': 2, 'name': 'A', 'parent_id': 1},
+        {'id': 3, 'name': 'A', 'parent_id': 1},
+        {'id': 4, 'name': 'B', 'parent_id': 3},
+        {'id': 5, 'name': 'C', 'parent_id': 2},
+    ]
+    index = tr.SectionIndex.load(api, 5, 6)
+    assert index.as_dict() == {(): 1, ('A',): 2, ('A', 'C'): 5}
+
+
+def test_section_index_empty_suite():
+    """ The root section is created in a suite without section """
+    api = Mock()
+    api.add_section.return_value = {'id': 20}
+    index = tr.SectionIndex(api, 5, 6)
+    assert index.ensure([]) == 1
+    api.add_section.assert_called_once_with(5, {'name': 'section', 'suite_id': 6})
+    assert index[()] == 20
+
+
+def test_iter_cases():
+    """ Test of method `iter_cases`: pages are followed """
+    inst = tr.TestRailApiUtils(TESTRAIL_URL)
+    pages = {
+        'get_cases/1&suite_id=2':
+        b'{"offset": 0, "_links": {"next": "/api/v2/get_cases/1&suite_id=2&offset=2"}, '
+        b'"cases": [{"id": 1, "title": "A"}, {"id": 2, "title": "B"}]}',
+        'get_cases/1&suite_id=2&offset=2':
+        b'{"offset": 2, "_links": {"next": null}, "cases": [{"id": 3, "title": "C"}]}',
+    }
+    # pylint: disable=protected-access
+    inst._APIClient__open = Mock(side_effect=lambda method, uri, data: io.BytesIO(pages[uri]))
+    assert list(inst.iter_cases(1, 2, fields=('id', ))) == [{'id': 1}, {'id': 2}, {'id': 3}]
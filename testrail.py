@@ -15,11 +15,23 @@ import json, base64
 import time
 import logging
 
+from json_stream import iter_json_array
+
 
 class APIClient:
     def __init__(self, base_url):
         self.user = ''
         self.password = ''
+        # Object with an `acquire()` method called before each request, and a
+        # `pause(seconds)` method called when TestRail asks to retry later
+        # (see `rate_limit`), or None
+        self.rate_limiter = None
+        # Cache of GET responses with an `invalidate(uri)` method called after each POST (see `api_cache`), or None
+        self.cache = None
+        # Object with a `remaining()` method giving the seconds left to
+        # publish (see `scheduler.Deadline`), or None: requests time out at
+        # the deadline, and pauses beyond it are not waited for
+        self.deadline = None
         if not base_url.endswith('/'):
             base_url += '/'
         self.__url = base_url + 'index.php?/api/v2/'
@@ -36,6 +48,8 @@ class APIClient:
     #                     (e.g. get_case/1)
     #
     def send_get(self, uri):
+        if self.cache is not None:
+            return self.__decode(self.cache.get(uri, lambda: self.__open('GET', uri, None).read()))
         return self.__send_request('GET', uri, None)
 
     #
@@ -52,9 +66,48 @@ class APIClient:
     #                     Python dict, strings must be UTF-8 encoded)
     #
     def send_post(self, uri, data):
-        return self.__send_request('POST', uri, data)
+        try:
+            return self.__send_request('POST', uri, data)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(uri)
+
+    #
+    # Send Get, iterating items
+    #
+    # Issues a GET request (read) against the API for a list, and yields the
+    # items of the list one by one (as Python dicts), decoded while the
+    # response is read. Paginated responses are followed.
+    #
+    # Arguments:
+    #
+    # uri                 The API method to call including parameters
+    #                     (e.g. get_cases/1&suite_id=2)
+    # key                 Name of the list in paginated responses
+    #                     (e.g. cases)
+    # fields              If set, keys of items to keep
+    #
+    def send_get_iter(self, uri, key=None, fields=None):
+        while uri:
+            meta = {}
+            response = self.__open('GET', uri, None)
+            try:
+                for item in iter_json_array(response, key, meta, fields):
+                    yield item
+            finally:
+                response.close()
+            next_link = (meta.get('_links') or {}).get('next')
+            uri = next_link.split('/api/v2/', 1)[-1] if next_link else None
 
     def __send_request(self, method, uri, data):
+        return self.__decode(self.__open(method, uri, data).read())
+
+    def __decode(self, response):
+        if response:
+            return json.loads(response.decode())
+        return {}
+
+    def __open(self, method, uri, data):
         url = self.__url + uri
         request = urllib.request.Request(url)
         if (method == 'POST'):
@@ -63,32 +116,32 @@ class APIClient:
         request.add_header('Authorization', 'Basic %s' % auth)
         request.add_header('Content-Type', 'application/json')
 
-        e = None
-        try:
-            response = urllib.request.urlopen(request).read()
-        except urllib.error.HTTPError as ex:
-            response = ex.read()
-            e = ex
-
-        if response:
-            result = json.loads(response.decode())
-        else:
-            result = {}
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
 
-        if e != None:
+        try:
+            if self.deadline is not None:
+                return urllib.request.urlopen(request, timeout=max(0.1, self.deadline.remaining()))
+            return urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            response = e.read()
             if e.code == 429:    # Too many requests
                 pause = int(e.headers.get('Retry-After', 60))
+                if self.deadline is not None and pause >= self.deadline.remaining():
+                    raise APIError('TestRail API returned HTTP 429: retry after %ss, beyond deadline' % pause)
                 logging.warning("Too many requests: pause for %ss", pause)
-                time.sleep(pause)
-                return self.__send_request(method, uri, data)
-            else:
-                if result and 'error' in result:
-                    error = '"' + result['error'] + '"'
+                if self.rate_limiter is not None:
+                    # Other requests sharing the limiter wait too
+                    self.rate_limiter.pause(pause)
                 else:
-                    error = 'No additional error message received'
-                raise APIError('TestRail API returned HTTP %s (%s)' % (e.code, error))
-
-        return result
+                    time.sleep(pause)
+                return self.__open(method, uri, data)
+            result = json.loads(response.decode()) if response else {}
+            if result and 'error' in result:
+                error = '"' + result['error'] + '"'
+            else:
+                error = 'No additional error message received'
+            raise APIError('TestRail API returned HTTP %s (%s)' % (e.code, error))
 
 
 class APIError(Exception):
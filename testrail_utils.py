@@ -2,11 +2,12 @@
 # -*- coding: UTF-8 -*-
 """ Various useful class using TestRail API """
 import logging
-import string
+import re
 
 import testrail
 
 API_ADD_RESULT_CASE_URL = 'add_result_for_case/{run_id}/{case_id}'
+API_ADD_RESULTS_CASES_URL = 'add_results_for_cases/{run_id}'
 API_GET_RUN_URL = 'get_run/{run_id}'
 API_GET_PLAN_URL = 'get_plan/{plan_id}'
 API_GET_TESTS_URL = 'get_tests/{run_id}'
@@ -23,11 +24,19 @@ API_GET_CASES_URL = 'get_cases/{project_id}&suite_id={suite_id}'
 API_DELETE_SECTION_URL = 'delete_section/{section_id}'
 API_ADD_PLAN_URL = 'add_plan/{project_id}'
 API_ADD_PLAN_ENTRY_URL = 'add_plan_entry/{plan_id}'
+API_UPDATE_PLAN_ENTRY_URL = 'update_plan_entry/{plan_id}/{entry_id}'
+API_GET_OPEN_PLANS_URL = 'get_plans/{project_id}&is_completed=0'
+API_CLOSE_PLAN_URL = 'close_plan/{plan_id}'
 
 
+NOT_DIGIT_REGEX = re.compile('[^0-9]')
+
+# Skipped and not run tests are "blocked": "untested" can't be set by a result
 ROBOTFWK_TO_TESTRAIL_STATUS = {
     "PASS": 1,
     "FAIL": 5,
+    "SKIP": 2,
+    "NOT RUN": 2,
 }
 
 
@@ -39,6 +48,34 @@ class TestRailApiUtils(testrail.APIClient):
         :param testrun_id: Testrail ID of the Test Run to feed
         :param testcase_info: Dict containing info on testcase
         """
+        data = self._get_result_data(testcase_info)
+        testcase_id = self.extract_testcase_id(testcase_info['id'])
+        if not testcase_id:
+            logging.error('Testcase ID is bad formatted: "%s"', testcase_info['id'])
+            return None
+
+        return self.send_post(API_ADD_RESULT_CASE_URL.format(run_id=testrun_id, case_id=testcase_id), data)
+
+    def add_results(self, testrun_id, testcases_info):
+        """ Add results to the given Test Run, in one request
+        :param testrun_id: Testrail ID of the Test Run to feed
+        :param testcases_info: List of dicts containing info on testcases
+        :return: List of results added
+        """
+        results = []
+        for testcase_info in testcases_info:
+            testcase_id = self.extract_testcase_id(testcase_info['id'])
+            if not testcase_id:
+                logging.error('Testcase ID is bad formatted: "%s"', testcase_info['id'])
+                continue
+            results.append(dict(self._get_result_data(testcase_info), case_id=testcase_id))
+        if not results:
+            return []
+        return self.send_post(API_ADD_RESULTS_CASES_URL.format(run_id=testrun_id), {'results': results})
+
+    @staticmethod
+    def _get_result_data(testcase_info):
+        """ Return the data of a result to add, from a dict containing info on testcase """
         data = {'status_id': ROBOTFWK_TO_TESTRAIL_STATUS[testcase_info.get('status')]}
         if 'version' in testcase_info:
             data['version'] = testcase_info.get('version')
@@ -46,12 +83,7 @@ class TestRailApiUtils(testrail.APIClient):
             data['comment'] = testcase_info.get('comment')
         if 'duration' in testcase_info:
             data['elapsed'] = str(testcase_info.get('duration')) + 's'
-        testcase_id = self.extract_testcase_id(testcase_info['id'])
-        if not testcase_id:
-            logging.error('Testcase ID is bad formatted: "%s"', testcase_info['id'])
-            return None
-
-        return self.send_post(API_ADD_RESULT_CASE_URL.format(run_id=testrun_id, case_id=testcase_id), data)
+        return data
     
     def add_result_alt(self, testrun_id, testcase_info):
         """ Add a result to the given Test Run
@@ -111,34 +143,64 @@ class TestRailApiUtils(testrail.APIClient):
         :param testplan_id: Testrail ID of the Test Plan
         :return: List of available Test Runs associated to a Test Plan in TestRail.
         """
-        testruns_list = []
+        return [run['id'] for entry in self.get_available_entries(testplan_id) for run in entry['runs']]
+
+    def get_available_entries(self, testplan_id):
+        """ Get the entries of a Test Plan, with their available Test Runs only
+        :param testplan_id: Testrail ID of the Test Plan
+        :return: List of entries (dicts with `id`, `suite_id` and `runs`) having available Test Runs
+        """
+        entries = []
         response = self.send_get(API_GET_PLAN_URL.format(plan_id=testplan_id))
         for entry in response['entries']:
-            for run in entry['runs']:
-                if not run['is_completed']:
-                    testruns_list.append(run['id'])
-        return testruns_list
+            runs = [run for run in entry['runs'] if not run['is_completed']]
+            if runs:
+                entries.append(dict(entry, runs=runs))
+        return entries
+
+    def iter_open_plans(self, project_id, fields=None):
+        """ Iterate on the open Test Plans of a project, decoded while the response is read
+        :param project_id: Testrail ID of the project
+        :param fields: If set, keys of Test Plans to keep
+        """
+        return self.send_get_iter(API_GET_OPEN_PLANS_URL.format(project_id=project_id), 'plans', fields)
 
     @staticmethod
     def extract_testcase_id(str_content):
         """ Extract testcase ID (TestRail) from the given string.
-            :param str_content: String containing a testcase ID.
+            :param str_content: String containing a testcase ID. Testcase ID (int) is returned as is.
             :return: Testcase ID (int). `None` if not found.
         """
+        if isinstance(str_content, int):
+            return str_content
+
         testcase_id = None
 
         # Manage multiple value but take only the first chunk
-        list_content = str_content.split()
+        list_content = str_content.split(None, 1)
         if list_content:
-            first_chunk = list_content[0]
             try:
-                testcase_id_str = ''.join(char for char in first_chunk if char in string.digits)
-                testcase_id = int(testcase_id_str)
+                testcase_id = int(NOT_DIGIT_REGEX.sub('', list_content[0]))
             except (TypeError, ValueError) as error:
                 logging.error(error)
 
         return testcase_id
 
+    def iter_tests(self, testrun_id, fields=None):
+        """ Iterate on the tests of a Test Run, decoded while the response is read
+        :param testrun_id: Testrail ID of the Test Run
+        :param fields: If set, keys of tests to keep
+        """
+        return self.send_get_iter(API_GET_TESTS_URL.format(run_id=testrun_id), 'tests', fields)
+
+    def iter_cases(self, project_id, suite_id, fields=None):
+        """ Iterate on the test cases of a Test Suite, decoded while the response is read
+        :param project_id: Testrail ID of the project
+        :param suite_id: Testrail ID of the Test Suite
+        :param fields: If set, keys of test cases to keep
+        """
+        return self.send_get_iter(API_GET_CASES_URL.format(project_id=project_id, suite_id=suite_id), 'cases', fields)
+
     def get_tests(self, testrun_id):
         try:
             return self.send_get(API_GET_TESTS_URL.format(run_id=testrun_id))
@@ -195,4 +257,88 @@ class TestRailApiUtils(testrail.APIClient):
     
     
     def add_plan_entry(self, plid, data):
-        return self.send_post(API_ADD_PLAN_ENTRY_URL.format(plan_id=plid), data)
\ No newline at end of file
+        return self.send_post(API_ADD_PLAN_ENTRY_URL.format(plan_id=plid), data)
+
+    def update_plan_entry(self, plid, entry_id, data):
+        return self.send_post(API_UPDATE_PLAN_ENTRY_URL.format(plan_id=plid, entry_id=entry_id), data)
+
+    def close_plan(self, plid):
+        return self.send_post(API_CLOSE_PLAN_URL.format(plan_id=plid), {})
+
+
+class SectionIndex(object):
+    """ In-memory index of the sections of a TestRail suite, by path.
+
+        A path is the tuple of section names from the root section of the suite: `()` is the root section (first
+        top-level section, created if missing), `('Child',)` a section under it, and so on.
+        Sections are fetched once; missing sections are created parent first.
+    """
+    ROOT_SECTION_NAME = 'section'
+
+    def __init__(self, api, project_id, suite_id, sections=()):
+        """ Init
+        :param api: Client to TestRail API
+        :param project_id: Testrail ID of the project
+        :param suite_id: Testrail ID of the suite
+        :param sections: Sections of the suite returned by TestRail
+        """
+        self.api = api
+        self.project_id = project_id
+        self.suite_id = suite_id
+        self._section_ids = {}
+        self._build(sections)
+
+    @classmethod
+    def load(cls, api, project_id, suite_id):
+        """ Return the index of the sections of a suite, fetched from TestRail in one request """
+        return cls(api, project_id, suite_id, api.get_sections(project_id, suite_id) or [])
+
+    def _build(self, sections):
+        """ Index `sections` under the root section """
+        children = {}    # parent ID -> child name -> child ID
+        for section in sections:
+            # Keep the first of siblings with the same name
+            children.setdefault(section.get('parent_id'), {}).setdefault(section['name'], section['id'])
+        top_level_sections = children.get(None, {})
+        if not top_level_sections:
+            return
+        pending = [((), next(iter(top_level_sections.values())))]
+        while pending:
+            path, section_id = pending.pop()
+            self._section_ids[path] = section_id
+            for name, child_id in children.get(section_id, {}).items():
+                pending.append((path + (name,), child_id))
+
+    def __contains__(self, path):
+        return tuple(path) in self._section_ids
+
+    def __getitem__(self, path):
+        return self._section_ids[tuple(path)]
+
+    def as_dict(self):
+        """ Return a copy of the index: path -> section ID """
+        return dict(self._section_ids)
+
+    def ensure(self, paths):
+        """ Create the sections of `paths` (and their parents) missing in TestRail, one depth level after the other
+        :param paths: Iterable of section paths
+        :return: Number of sections created
+        """
+        missing = set()
+        for path in list(paths) + [()]:
+            path = tuple(path)
+            for depth in range(len(path) + 1):
+                if path[:depth] not in self._section_ids:
+                    missing.add(path[:depth])
+
+        created = 0
+        for depth in sorted({len(path) for path in missing}):
+            for path in sorted(path for path in missing if len(path) == depth):
+                data = {'name': path[-1] if path else self.ROOT_SECTION_NAME, 'suite_id': self.suite_id}
+                if path:
+                    data['parent_id'] = self._section_ids[path[:-1]]
+                self._section_ids[path] = self.api.add_section(self.project_id, data)['id']
+                created += 1
+                logging.debug('Section "%s" #%d created in Test Suite #%d', '/'.join(path), self._section_ids[path],
+                              self.suite_id)
+        return created